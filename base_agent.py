@@ -0,0 +1,135 @@
+import asyncio
+import inspect
+import time
+from typing import Any, List, Optional, Tuple, Union
+from anthropic import Anthropic, AsyncAnthropic
+from anthropic.types import Message
+from cache import ResponseCache, cache_key
+from tokens import fit_to_context_window, estimate_request_tokens
+from ratelimit import RateLimiter
+from streaming import StreamStats, TextCallback, stream_message, render_text
+from continuation import Completion, complete_with_continuation, response_text
+from telemetry import Span, get_telemetry
+from resilience import call_with_retries
+from events import emit
+from config import settings
+from utils import calculate_subagent_cost
+
+AnthropicClient = Union[Anthropic, AsyncAnthropic]
+
+class BaseAgent:
+    """Shared plumbing for the agents: model calls and cost tracking.
+
+    Agents accept either client flavour. With an ``AsyncAnthropic`` client the
+    request is awaited on the event loop; a blocking ``Anthropic`` client is run
+    in a worker thread so it never stalls other coroutines. When a response
+    cache is attached, identical requests are answered from it without an API call.
+    With ``stream`` enabled, responses are streamed and each text delta goes to
+    ``on_text`` (the event bus by default) as it arrives. A shared rate limiter, if
+    given, is charged for every request that actually goes over the network.
+    Every call is recorded as a telemetry span under the agent's ``role``, with
+    the routing label when a model router chose the model.
+    """
+
+    role = "agent"
+
+    def __init__(self, anthropic_client: AnthropicClient, model: str, response_cache: Optional[ResponseCache] = None, stream: bool = False,
+                 rate_limiter: Optional[RateLimiter] = None):
+        self.anthropic_client = anthropic_client
+        self.model = model
+        self.response_cache = response_cache
+        self.stream = stream
+        self.rate_limiter = rate_limiter
+        self.stream_stats: List[StreamStats] = []
+        self.total_cost = 0.0
+
+    async def _create_message(self, on_text: Optional[TextCallback] = None, route: Optional[str] = None, **kwargs: Any) -> Message:
+        started_at, started = time.time(), time.perf_counter()
+        kwargs["messages"] = fit_to_context_window(kwargs["model"], kwargs.get("system"), kwargs["messages"], kwargs["max_tokens"])
+        key = None
+        if self.response_cache is not None:
+            key = cache_key(kwargs["model"], kwargs.get("system"), kwargs["messages"], kwargs["max_tokens"])
+            cached_response = self.response_cache.get(key)
+            if cached_response is not None:
+                if self.stream:
+                    (on_text or render_text)(response_text(cached_response))
+                    if on_text is None:
+                        emit("text_delta", "\n")
+                self._record_span(kwargs["model"], started_at, started, cached_response, cache_hit=True, route=route)
+                return cached_response
+
+        retries = 0
+
+        def count_retry() -> None:
+            nonlocal retries
+            retries += 1
+
+        try:
+            # Streamed output can't be raced: a duplicate would print every token twice.
+            hedge_key = None if self.stream else f"{self.role}:{kwargs['model']}"
+            response, stats = await call_with_retries(self._send, on_text, on_retry=count_retry, hedge_key=hedge_key, **kwargs)
+        except Exception as e:
+            self._record_span(kwargs["model"], started_at, started, retries=retries, error=f"{type(e).__name__}: {e}", route=route)
+            raise
+        self._record_span(kwargs["model"], started_at, started, response, stats, retries, route=route)
+        if key is not None:
+            self.response_cache.put(key, response)
+        return response
+
+    def _record_span(self, model: str, started_at: float, started: float, response: Optional[Message] = None, stats: Optional[StreamStats] = None,
+                     retries: int = 0, cache_hit: bool = False, error: Optional[str] = None, route: Optional[str] = None) -> None:
+        input_tokens = response.usage.input_tokens if response is not None else 0
+        output_tokens = response.usage.output_tokens if response is not None else 0
+        get_telemetry().record(Span(
+            kind="model", role=self.role, model=model, started_at=started_at, latency=time.perf_counter() - started,
+            ttft=stats.time_to_first_token if stats is not None else None,
+            input_tokens=input_tokens, output_tokens=output_tokens,
+            cost=0.0 if cache_hit or response is None else calculate_subagent_cost(model, input_tokens, output_tokens),
+            retries=retries, cache_hit=cache_hit, status="error" if error else "ok", error=error, route=route,
+        ))
+
+    async def _send(self, on_text: Optional[TextCallback], **kwargs: Any) -> Tuple[Message, Optional[StreamStats]]:
+        if self.rate_limiter is None:
+            return await self._transmit(on_text, **kwargs)
+
+        estimated_tokens = estimate_request_tokens(kwargs.get("system"), kwargs["messages"]) + kwargs["max_tokens"]
+        await self.rate_limiter.acquire(estimated_tokens)
+        response, stats = await self._transmit(on_text, **kwargs)
+        self.rate_limiter.settle(estimated_tokens, response.usage.input_tokens + response.usage.output_tokens)
+        return response, stats
+
+    async def _transmit(self, on_text: Optional[TextCallback], **kwargs: Any) -> Tuple[Message, Optional[StreamStats]]:
+        if self.stream:
+            response, stats = await stream_message(self.anthropic_client, on_text or render_text, **kwargs)
+            self.stream_stats.append(stats)
+            if on_text is None:
+                emit("text_delta", "\n")
+            ttft = f"{stats.time_to_first_token:.2f}s" if stats.time_to_first_token is not None else "n/a"
+            emit("stream_stats", f"Time to first token: {ttft}, {stats.tokens_per_second:.1f} tokens/s", role=self.role,
+                 time_to_first_token=stats.time_to_first_token, tokens_per_second=stats.tokens_per_second)
+            return response, stats
+
+        create = self.anthropic_client.messages.create
+        # The SDK wraps AsyncMessages.create in a plain decorator, so iscoroutinefunction alone can't recognise it.
+        if isinstance(self.anthropic_client, AsyncAnthropic) or inspect.iscoroutinefunction(create):
+            return await create(**kwargs), None
+        return await asyncio.to_thread(create, **kwargs), None
+
+    async def _complete(self, on_text: Optional[TextCallback] = None, route: Optional[str] = None, **kwargs: Any) -> Completion:
+        return await complete_with_continuation(
+            lambda **request: self._create_message(on_text=on_text, route=route, **request),
+            settings.MAX_CONTINUATION_ROUNDS, **kwargs)
+
+    def _emit_usage(self, label: str, input_tokens: int, output_tokens: int, cost: float) -> None:
+        emit("usage", f"Input Tokens: {input_tokens}, Output Tokens: {output_tokens}\n{label}: ${cost:.4f}", role=self.role,
+             input_tokens=input_tokens, output_tokens=output_tokens, cost=cost)
+
+    def _track_completion_cost(self, completion: Completion, model: Optional[str] = None) -> float:
+        return sum(self._track_cost(response, model) for response in completion.responses)
+
+    def _track_cost(self, response: Message, model: Optional[str] = None) -> float:
+        if getattr(response, "cache_hit", False):
+            return 0.0
+        cost = calculate_subagent_cost(model or self.model, response.usage.input_tokens, response.usage.output_tokens)
+        self.total_cost += cost
+        return cost
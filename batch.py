@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
+from config import settings
+from constants import MODELS
+from events import configure_logging, emit
+from exceptions import FileIOError
+from main import async_main, configure_event_output, create_router, RunResult
+
+if TYPE_CHECKING:
+    from cache import ResponseCache
+    from ratelimit import RateLimiter
+    from router import ModelRouter
+    from reuse import ReuseIndex
+
+
+def item_id(item: Dict[str, Any]) -> str:
+    if item.get("id") is not None:
+        return str(item["id"])
+    # Without an explicit id, hash the item itself so a resumed run recognises it even if lines move.
+    return hashlib.sha256(json.dumps(item, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def load_objectives(path: str) -> List[Dict[str, Any]]:
+    items = []
+    try:
+        with open(path, 'r') as file:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as e:
+                    emit("warning", f"[bold yellow]Warning:[/bold yellow] Skipping line {line_number}: invalid JSON ({e})")
+                    continue
+                if not isinstance(item, dict) or not item.get("objective"):
+                    emit("warning", f"[bold yellow]Warning:[/bold yellow] Skipping line {line_number}: missing 'objective'")
+                    continue
+                if item.get("model") and item["model"] not in MODELS:
+                    emit("warning", f"[bold yellow]Warning:[/bold yellow] Skipping line {line_number}: unknown model {item['model']}")
+                    continue
+                items.append(item)
+    except IOError as e:
+        raise FileIOError(f"Error reading file: {path}") from e
+    return items
+
+def completed_ids(path: str) -> Set[str]:
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a torn last line; that item simply runs again.
+                continue
+            if record.get("status") == "completed":
+                done.add(record["id"])
+    return done
+
+class ResultWriter:
+    def __init__(self, path: str, append: bool):
+        self._file = open(path, 'a' if append else 'w')
+        self._lock = asyncio.Lock()
+
+    async def write(self, record: Dict[str, Any]) -> None:
+        async with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+async def run_batch(input_path: str, output_path: str, concurrency: int, rate_limiter: RateLimiter, defaults: Dict[str, Any],
+                    resume: bool = False, response_cache: Optional[ResponseCache] = None, router: Optional[ModelRouter] = None,
+                    reuse_index: Optional[ReuseIndex] = None) -> List[Dict[str, Any]]:
+    items = load_objectives(input_path)
+    skip = completed_ids(output_path) if resume else set()
+    pending = [item for item in items if item_id(item) not in skip]
+    emit("batch_started", f"{len(items)} objectives, {len(items) - len(pending)} already completed, {len(pending)} to run "
+         f"with concurrency {concurrency}", title="Batch Run", style="blue", objectives=len(items), pending=len(pending))
+
+    from search import SearchService
+    from dependencies import get_async_anthropic_client, get_tavily_client
+
+    anthropic_client = get_async_anthropic_client()
+    tavily_client = search_service = None
+    if any(item.get("search", defaults["search"]) for item in pending):
+        tavily_client = get_tavily_client()
+        # Shared so identical searches across objectives are cached and coalesced together.
+        search_service = SearchService(tavily_client, settings.SEARCH_CACHE_PATH, settings.SEARCH_CACHE_TTL)
+    writer = ResultWriter(output_path, append=resume)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await async_main(
+                    anthropic_client, tavily_client, item["objective"], item.get("file"),
+                    item.get("search", defaults["search"]), item.get("model", defaults["model"]),
+                    item.get("cost_limit", defaults["cost_limit"]),
+                    plan_mode=item.get("plan", defaults["plan"]), response_cache=response_cache, rate_limiter=rate_limiter,
+                    search_service=search_service, large_input=item.get("large_input", False), router=router,
+                    reuse_index=reuse_index,
+                )
+            except Exception as e:
+                # One broken objective must not take down the rest of the batch.
+                result = RunResult(objective=item["objective"], status="error", error=f"{type(e).__name__}: {e}")
+            record = {"id": item_id(item), **asdict(result), "duration": round(time.perf_counter() - started, 3)}
+            await writer.write(record)
+            return record
+
+    try:
+        records = await asyncio.gather(*(run_item(item) for item in pending))
+    finally:
+        writer.close()
+
+    completed = [record for record in records if record["status"] == "completed"]
+    total_cost = sum(record['cost'] for record in records)
+    emit("batch_complete", f"Completed: {len(completed)}/{len(records)}\n"
+         f"Total Cost: ${total_cost:.4f}\n"
+         f"Rate limiter wait: {rate_limiter.total_wait:.1f}s\n"
+         f"Results written to {output_path}",
+         title="Batch Summary", style="green", completed=len(completed), total=len(records), cost=total_cost, output=output_path)
+    return records
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many objectives from a JSONL file")
+    parser.add_argument("input", help="JSONL file with one {\"objective\": ...} object per line; optional keys: id, file, search, model, cost_limit, plan, large_input")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file that receives one result record per objective")
+    parser.add_argument("--concurrency", type=int, help="Maximum number of objectives running at once (default: BATCH_CONCURRENCY)")
+    parser.add_argument("--rpm", type=float, help="Global model requests per minute, 0 for no limit (default: BATCH_REQUESTS_PER_MINUTE)")
+    parser.add_argument("--tpm", type=float, help="Global model tokens per minute, 0 for no limit (default: BATCH_TOKENS_PER_MINUTE)")
+    parser.add_argument("--resume", action="store_true", help="Skip objectives already completed in --output and append to it")
+    parser.add_argument("--search", action="store_true", help="Enable search for items that don't set 'search'")
+    parser.add_argument("--model", choices=MODELS, help="Model for every role in items that don't set 'model' (default: the per-role settings)")
+    parser.add_argument("--cost-limit", type=float, default=0.0, help="Cost limit for items that don't set 'cost_limit'")
+    parser.add_argument("--plan", action="store_true", help="Use plan-ahead mode for items that don't set 'plan'")
+    parser.add_argument("--cache", action="store_true", help="Reuse cached model responses for identical requests")
+    parser.add_argument("--route", action="store_true", help="Route each sub-task to the cheapest model tier likely to handle it")
+    parser.add_argument("--reuse", action="store_true", help="Reuse results of similar sub-tasks from earlier objectives and runs")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Send a duplicate of any non-streamed call still running past the p95 latency of its role and model")
+    parser.add_argument("--metrics-jsonl", help="Append one telemetry span per model/search call to this JSONL file")
+    parser.add_argument("--metrics-prom", help="Write aggregated call metrics to this Prometheus textfile")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Run headless: no terminal output and no log records on stderr (the log file is still written)")
+    parser.add_argument("--events-jsonl", help="Append one JSON object per progress event to this file")
+    args = parser.parse_args()
+
+    from cache import ResponseCache
+    from ratelimit import RateLimiter
+    from telemetry import get_telemetry
+    from resilience import enable_hedging, print_resilience_summary
+    from reuse import ReuseIndex
+
+    configure_logging(settings.LOG_LEVEL, settings.LOG_FILE, to_console=not args.quiet)
+    configure_event_output(args.quiet, args.events_jsonl)
+    if args.hedge:
+        enable_hedging()
+
+    # Defaults are resolved only now, so --help doesn't have to load the settings.
+    concurrency = args.concurrency or settings.BATCH_CONCURRENCY
+    rpm = args.rpm if args.rpm is not None else settings.BATCH_REQUESTS_PER_MINUTE
+    tpm = args.tpm if args.tpm is not None else settings.BATCH_TOKENS_PER_MINUTE
+    rate_limiter = RateLimiter(rpm or None, tpm or None)
+    response_cache = None
+    if args.cache:
+        response_cache = ResponseCache(settings.RESPONSE_CACHE_PATH, settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_MAX_BYTES)
+    defaults = {"search": args.search, "model": args.model, "cost_limit": args.cost_limit, "plan": args.plan}
+
+    # One router for the whole batch, so every objective learns from the outcomes of the others.
+    router = create_router() if args.route else None
+    # Shared too: each objective's results become reusable by the objectives that finish after it.
+    reuse_index = ReuseIndex(settings.REUSE_INDEX_PATH, settings.REUSE_MAX_ENTRIES) if args.reuse else None
+    asyncio.run(run_batch(args.input, args.output, concurrency, rate_limiter, defaults, args.resume, response_cache, router, reuse_index))
+
+    telemetry = get_telemetry()
+    telemetry.print_summary()
+    print_resilience_summary()
+    if router is not None:
+        router.print_summary()
+    if args.metrics_jsonl:
+        telemetry.export_jsonl(args.metrics_jsonl)
+    if args.metrics_prom:
+        telemetry.export_prometheus(args.metrics_prom)
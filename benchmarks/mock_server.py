@@ -0,0 +1,313 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+WORDS = ("the service request handler returns a result after checking the input for errors and writes a log entry "
+         "so that later steps can build on the parsed configuration while the worker keeps every queue bounded").split()
+
+@dataclass
+class MockConfig:
+    """Shape of the synthetic transcript the mock server plays back."""
+    iterations: int = 3
+    plan_subtasks: int = 0
+    output_tokens: int = 400
+    refiner_files: int = 3
+    refiner_file_lines: int = 40
+    truncate_rounds: int = 0
+    ttft: float = 0.0
+    tokens_per_second: float = 0.0
+    search_latency: float = 0.0
+    rate_limit_every: int = 0
+    retry_after: float = 0.05
+    straggler_every: int = 0
+    straggler_delay: float = 0.0
+    transcript: Optional[Dict[str, List[str]]] = None
+
+@dataclass
+class MockState:
+    orchestrator_calls: Dict[str, int] = field(default_factory=dict)
+    transcript_positions: Dict[str, int] = field(default_factory=dict)
+    texts: Dict[str, str] = field(default_factory=dict)
+    requests: int = 0
+    searches: int = 0
+    attempts: int = 0
+    rate_limited: int = 0
+
+def estimate_tokens(text: str) -> int:
+    return max(1, int(len(text) / 3.5))
+
+def filler(seed: str, tokens: int) -> str:
+    rng = random.Random(seed)
+    words = [rng.choice(WORDS) for _ in range(max(1, int(tokens * 3.5 / 6)))]
+    lines = [" ".join(words[i:i + 14]) + "." for i in range(0, len(words), 14)]
+    return "\n".join(lines)
+
+def classify(prompt: str) -> str:
+    if "You maintain a rolling summary" in prompt:
+        return "summarizer"
+    if "plan ALL of the remaining sub-tasks" in prompt:
+        return "planner"
+    if "break down the objective into the next sub-task" in prompt:
+        return "orchestrator"
+    if prompt.startswith("Objective: ") and "Sub-task results:" in prompt:
+        return "refiner"
+    return "sub_agent"
+
+def refiner_text(config: MockConfig, seed: str) -> str:
+    rng = random.Random(seed)
+    files = [f"module_{index}.py" for index in range(config.refiner_files)]
+    structure = {"bench_project": {"src": {name: None for name in files}, "README.md": None}}
+    parts = ["Project Name: bench_project", f"<folder_structure>\n{json.dumps(structure, indent=2)}\n</folder_structure>"]
+    for name in files:
+        body = "\n".join(f"def step_{line}(value):\n    return value + {rng.randint(0, 999)}" for line in range(config.refiner_file_lines // 2))
+        parts.append(f"Filename: {name}\n```python\n{body}\n```")
+    parts.append(f"Filename: README.md\n```markdown\n{filler(seed, 100)}\n```")
+    return "\n\n".join(parts)
+
+class MockAnthropic:
+    """Deterministic stand-in for the Messages and Tavily search APIs.
+
+    Responses depend only on the request, so a continuation request (the original
+    messages plus an assistant prefill) is answered from the same full text, cut
+    into ``truncate_rounds + 1`` pieces that each stop on ``max_tokens``.
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None):
+        self._lock = threading.Lock()
+        self.configure(config or MockConfig())
+
+    def configure(self, config: MockConfig) -> None:
+        with self._lock:
+            self.config = config
+            self.state = MockState()
+
+    def _transcript_text(self, role: str) -> Optional[str]:
+        texts = (self.config.transcript or {}).get(role)
+        if not texts:
+            return None
+        position = self.state.transcript_positions.get(role, 0)
+        self.state.transcript_positions[role] = position + 1
+        return texts[position % len(texts)]
+
+    def _generate(self, role: str, prompt: str, seed: str) -> str:
+        config = self.config
+        if role in ("orchestrator", "planner"):
+            objective = prompt.split("Objective: ", 1)[-1].split("\n", 1)[0]
+            calls = self.state.orchestrator_calls.get(objective, 0)
+            self.state.orchestrator_calls[objective] = calls + 1
+            recorded = self._transcript_text(role)
+            if recorded is not None:
+                return recorded
+            rounds = 1 if role == "planner" else config.iterations
+            if calls >= rounds:
+                return "The task is complete: every sub-task has been carried out."
+            if role == "planner":
+                subtasks = [{"id": str(index + 1), "prompt": f"Sub-task {index + 1}: {filler(seed + str(index), 40)}",
+                             "depends_on": [] if index < config.plan_subtasks // 2 or index == 0 else ["1"],
+                             "search_query": f"how to implement part {index + 1}"}
+                            for index in range(config.plan_subtasks)]
+                return f"<plan>{json.dumps({'subtasks': subtasks})}</plan>"
+            return f"Sub-task {calls + 1}: {filler(seed, config.output_tokens // 4)}\n{json.dumps({'search_query': f'how to implement step {calls + 1}'})}"
+        recorded = self._transcript_text(role)
+        if recorded is not None:
+            return recorded
+        if role == "refiner":
+            return refiner_text(config, seed)
+        return filler(seed, config.output_tokens)
+
+    def admit(self) -> Tuple[bool, float]:
+        """Count a model request; return whether to reject it with a 429 and how long to hold it back as a straggler."""
+        with self._lock:
+            self.state.attempts += 1
+            config = self.config
+            if config.rate_limit_every and self.state.attempts % config.rate_limit_every == 0:
+                self.state.rate_limited += 1
+                return True, 0.0
+            straggler = config.straggler_every and self.state.attempts % config.straggler_every == 0
+            return False, config.straggler_delay if straggler else 0.0
+
+    def respond(self, body: Dict[str, Any]) -> Tuple[str, str, int, int]:
+        messages = body["messages"]
+        prefill = ""
+        if messages and messages[-1]["role"] == "assistant":
+            prefill = messages[-1]["content"] if isinstance(messages[-1]["content"], str) else "".join(
+                block.get("text", "") for block in messages[-1]["content"])
+            messages = messages[:-1]
+        prompt = "\n".join(block.get("text", "") for message in messages if message["role"] == "user"
+                           for block in (message["content"] if isinstance(message["content"], list) else [{"text": message["content"]}]))
+        key = hashlib.sha256(json.dumps([body.get("system"), messages], sort_keys=True).encode("utf-8")).hexdigest()
+        with self._lock:
+            self.state.requests += 1
+            text = self.state.texts.get(key)
+            if text is None:
+                text = self._generate(classify(prompt), prompt, key)
+                self.state.texts[key] = text
+        input_tokens = estimate_tokens(json.dumps(body["messages"]) + (body.get("system") or ""))
+        if not prefill:
+            start = 0
+        elif text.startswith(prefill):
+            start = len(prefill)
+        else:
+            return "", "end_turn", input_tokens, 1
+
+        pieces = self.config.truncate_rounds + 1
+        boundaries = [len(text) * index // pieces for index in range(1, pieces)] + [len(text)]
+        # Skip cut points inside the whitespace the client strips off its prefill, or the same piece would repeat.
+        end = next((boundary for boundary in boundaries if text[start:boundary].strip()), len(text))
+        stop_reason = "max_tokens" if end < len(text) else "end_turn"
+        chunk = text[start:end]
+        return chunk, stop_reason, input_tokens, estimate_tokens(chunk)
+
+    def search(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.state.searches += 1
+        if self.config.search_latency:
+            time.sleep(self.config.search_latency)
+        return {"query": body.get("query"), "answer": filler(body.get("query", ""), 80), "results": []}
+
+def sse_events(model: str, text: str, stop_reason: str, input_tokens: int, output_tokens: int) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    yield "message_start", {"type": "message_start", "message": {"id": "msg_mock", "type": "message", "role": "assistant", "model": model,
+                                                                  "content": [], "stop_reason": None, "stop_sequence": None,
+                                                                  "usage": {"input_tokens": input_tokens, "output_tokens": 1}}}
+    yield "content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}
+    for delta in re.findall(r"\S*\s*", text):
+        if delta:
+            yield "content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": delta}}
+    yield "content_block_stop", {"type": "content_block_stop", "index": 0}
+    yield "message_delta", {"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                            "usage": {"output_tokens": output_tokens}}
+    yield "message_stop", {"type": "message_stop"}
+
+def make_handler(mock: MockAnthropic) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; with Nagle on, delayed ACKs add ~40ms to every response.
+        disable_nagle_algorithm = True
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _send_json(self, payload: Dict[str, Any], status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("content-type", "application/json")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def handle_one_request(self) -> None:
+            try:
+                super().handle_one_request()
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up on this request (a cancelled hedge or timeout); that's routine, not a server error.
+                self.close_connection = True
+
+        def do_POST(self) -> None:
+            body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+            if self.path.rstrip("/").endswith("/search"):
+                self._send_json(mock.search(body))
+                return
+            if not self.path.rstrip("/").endswith("/v1/messages"):
+                self._send_json({"type": "error", "error": {"type": "not_found_error", "message": self.path}}, status=404)
+                return
+
+            rejected, hold = mock.admit()
+            config = mock.config
+            if rejected:
+                self._send_json({"type": "error", "error": {"type": "rate_limit_error", "message": "mock rate limit"}}, status=429,
+                                headers={"retry-after": str(config.retry_after)})
+                return
+            if hold:
+                time.sleep(hold)
+            text, stop_reason, input_tokens, output_tokens = mock.respond(body)
+            if config.ttft:
+                time.sleep(config.ttft)
+            token_delay = 1.0 / config.tokens_per_second if config.tokens_per_second else 0.0
+            if not body.get("stream"):
+                if token_delay:
+                    time.sleep(output_tokens * token_delay)
+                self._send_json({"id": "msg_mock", "type": "message", "role": "assistant", "model": body["model"],
+                                 "content": [{"type": "text", "text": text}], "stop_reason": stop_reason, "stop_sequence": None,
+                                 "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens}})
+                return
+
+            self.send_response(200)
+            self.send_header("content-type", "text/event-stream")
+            self.send_header("connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            for event, data in sse_events(body["model"], text, stop_reason, input_tokens, output_tokens):
+                if token_delay and event == "content_block_delta":
+                    time.sleep(estimate_tokens(data["delta"]["text"]) * token_delay)
+                self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+    return Handler
+
+class MockServer:
+    """Threaded local HTTP server that answers both Anthropic and Tavily requests."""
+
+    def __init__(self, mock: Optional[MockAnthropic] = None, host: str = "127.0.0.1", port: int = 0):
+        self.mock = mock or MockAnthropic()
+        self._server = ThreadingHTTPServer((host, port), make_handler(self.mock))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockServer":
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+def load_transcript(path: str) -> Dict[str, List[str]]:
+    with open(path, 'r') as file:
+        transcript = json.load(file)
+    unknown = set(transcript) - {"orchestrator", "planner", "sub_agent", "refiner", "summarizer"}
+    if unknown:
+        raise ValueError(f"Unknown transcript roles: {', '.join(sorted(unknown))}")
+    return transcript
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Anthropic Messages and Tavily search APIs")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--iterations", type=int, default=3, help="Sub-tasks the orchestrator hands out before completing")
+    parser.add_argument("--plan-subtasks", type=int, default=4, help="Sub-tasks in the first plan for --plan runs")
+    parser.add_argument("--output-tokens", type=int, default=400, help="Approximate output tokens per sub-agent response")
+    parser.add_argument("--refiner-files", type=int, default=3, help="Files in the refiner's project output")
+    parser.add_argument("--refiner-file-lines", type=int, default=40, help="Lines per refiner output file")
+    parser.add_argument("--truncate-rounds", type=int, default=0, help="Times each response stops on max_tokens before finishing")
+    parser.add_argument("--ttft", type=float, default=0.0, help="Seconds before the first token of each response")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Output pacing (0 for instant)")
+    parser.add_argument("--search-latency", type=float, default=0.0, help="Seconds per search request")
+    parser.add_argument("--transcript", help="JSON file mapping a role (orchestrator, planner, sub_agent, refiner, summarizer) to response texts to replay in order")
+    args = parser.parse_args()
+
+    config = MockConfig(iterations=args.iterations, plan_subtasks=args.plan_subtasks, output_tokens=args.output_tokens,
+                        refiner_files=args.refiner_files, refiner_file_lines=args.refiner_file_lines, truncate_rounds=args.truncate_rounds,
+                        ttft=args.ttft, tokens_per_second=args.tokens_per_second, search_latency=args.search_latency,
+                        transcript=load_transcript(args.transcript) if args.transcript else None)
+    server = MockServer(MockAnthropic(config), port=args.port)
+    print(f"Mock API listening on {server.url}; set ANTHROPIC_BASE_URL and TAVILY_BASE_URL to it.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List
+
+from mock_server import MockAnthropic, MockConfig, MockServer, load_transcript
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL = "claude-3-haiku-20240307"
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    mock: MockConfig = field(default_factory=MockConfig)
+    search: bool = False
+    plan: bool = False
+    stream: bool = False
+    route: bool = False
+    hedge: bool = False
+    reuse: bool = False
+    file_kb: int = 0
+
+SCENARIOS = [
+    Scenario("short", "One sub-task, small outputs", MockConfig(iterations=1, output_tokens=300, refiner_files=2)),
+    Scenario("long", "Twelve iterations with search; history outgrows the context budget",
+             MockConfig(iterations=12, output_tokens=2500), search=True),
+    Scenario("large_file", "Two iterations over a 2 MB input file", MockConfig(iterations=2), file_kb=2048),
+    Scenario("big_refiner", "Refiner emits 300 files of 200 lines each", MockConfig(iterations=2, refiner_files=300, refiner_file_lines=200)),
+    Scenario("many_results", "Thirty long sub-task results refined through the merge tree", MockConfig(iterations=30, output_tokens=2000)),
+    Scenario("truncated", "Every response stops on max_tokens three times", MockConfig(iterations=3, output_tokens=1500, truncate_rounds=3)),
+    Scenario("plan", "Plan-ahead mode with eight sub-tasks and search", MockConfig(plan_subtasks=8), search=True, plan=True),
+    Scenario("stream", "Three iterations streamed over SSE", MockConfig(iterations=3, output_tokens=800), stream=True),
+    Scenario("rate_limited", "Every fifth model request is answered with a 429 and Retry-After",
+             MockConfig(iterations=4, output_tokens=600, rate_limit_every=5)),
+    Scenario("stragglers", "Plan mode where one model request in forty stalls for 0.5s, with hedging",
+             MockConfig(plan_subtasks=80, output_tokens=200, straggler_every=40, straggler_delay=0.5), plan=True, hedge=True),
+    Scenario("routed", "Six iterations with per-role models and the sub-task router", MockConfig(iterations=6, output_tokens=800), route=True),
+    Scenario("reused", "Six iterations with --reuse; after the warm-up run, sub-tasks are answered from the reuse index",
+             MockConfig(iterations=6, output_tokens=800), reuse=True),
+]
+
+# Metrics where a higher value is a regression when comparing against a baseline.
+COMPARED_METRICS = ["wall_s", "overhead_s", "peak_mem_mb"]
+
+def write_input_file(path: str, size_kb: int) -> None:
+    line = "def handler_{0}(request):\n    return {{'id': {0}, 'status': 'ok', 'payload': request.get('payload')}}\n\n"
+    with open(path, 'w') as file:
+        index = 0
+        while file.tell() < size_kb * 1024:
+            file.write(line.format(index))
+            index += 1
+
+class StageTimer:
+    """Wraps module-level functions so the time spent in each is accumulated per stage."""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+        self._originals: List[tuple] = []
+
+    def wrap(self, module: Any, name: str, stage: str) -> None:
+        original = getattr(module, name)
+
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.totals[stage] = self.totals.get(stage, 0.0) + time.perf_counter() - started
+
+        self._originals.append((module, name, original))
+        setattr(module, name, timed)
+
+    def reset(self) -> None:
+        self.totals = {}
+
+    def restore(self) -> None:
+        for module, name, original in reversed(self._originals):
+            setattr(module, name, original)
+        self._originals = []
+
+def run_scenario(loop: asyncio.AbstractEventLoop, scenario: Scenario, mock: MockAnthropic, workdir: str, repeat: int,
+                 verbose: bool) -> Dict[str, Any]:
+    import main
+    from dependencies import get_async_anthropic_client, get_tavily_client
+    from telemetry import get_telemetry
+    from resilience import get_resilience
+    from events import configure_logging, get_event_bus
+    from reuse import ReuseIndex
+    from config import settings
+
+    input_path = None
+    if scenario.file_kb:
+        input_path = os.path.join(workdir, f"{scenario.name}_input.py")
+        write_input_file(input_path, scenario.file_kb)
+    objective = f"Build the {scenario.name} benchmark project"
+    if input_path:
+        objective = f"{objective} from {input_path}"
+
+    timer = StageTimer()
+    timer.wrap(main, "read_file", "read_input")
+    timer.wrap(main, "extract_folder_structure_and_code", "parse_output")
+    timer.wrap(main, "create_folder_structure", "materialize")
+    timer.wrap(main, "save_exchange_log", "save_log")
+    telemetry = get_telemetry()
+    anthropic_client = get_async_anthropic_client()
+    resilience = get_resilience("anthropic")
+    resilience.hedging = scenario.hedge
+    tavily_client = get_tavily_client()
+    # Fresh per scenario and kept across its runs: the warm-up run fills it, the timed runs reuse from it.
+    reuse_index = ReuseIndex(os.path.join(workdir, f"{scenario.name}_reuse.sqlite3"), settings.REUSE_MAX_ENTRIES) if scenario.reuse else None
+    configure_logging(settings.LOG_LEVEL, settings.LOG_FILE, to_console=verbose)
+    if not verbose:
+        # Headless, as in --quiet: events are dropped before any rendering, so the numbers are the framework's own cost.
+        get_event_bus().configure([])
+
+    def run_once() -> Dict[str, Any]:
+        mock.configure(scenario.mock)
+        timer.reset()
+        first_span = len(telemetry.snapshot())
+        first_hedge = resilience.hedges
+        run_dir = tempfile.mkdtemp(dir=workdir)
+        cwd = os.getcwd()
+        os.chdir(run_dir)
+        try:
+            started = time.perf_counter()
+            # Routed runs use the per-role model settings, so the router has cheaper tiers to choose from.
+            result = loop.run_until_complete(main.async_main(anthropic_client, tavily_client, objective, input_path, scenario.search,
+                                                             None if scenario.route else MODEL, 0.0, plan_mode=scenario.plan,
+                                                             stream=scenario.stream, router=main.create_router() if scenario.route else None,
+                                                             reuse_index=reuse_index))
+            wall = time.perf_counter() - started
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(run_dir, ignore_errors=True)
+        if result.status != "completed":
+            raise RuntimeError(f"Scenario {scenario.name} failed: {result.error}")
+        spans = telemetry.snapshot()[first_span:]
+        stages = dict(timer.totals)
+        for span in spans:
+            stages[span.role] = stages.get(span.role, 0.0) + span.latency
+        model_spans = [span for span in spans if span.kind != "search"]
+        return {
+            "wall_s": wall,
+            "stages": stages,
+            "model_calls": len(model_spans),
+            "http_requests": mock.state.attempts,
+            "retries": sum(span.retries for span in spans),
+            "hedges": resilience.hedges - first_hedge,
+            "searches": mock.state.searches,
+            "output_tokens": sum(span.output_tokens for span in model_spans),
+            # In-flight calls overlap in plan mode, so this undercounts overhead there; it's still comparable run to run.
+            "overhead_s": max(0.0, wall - sum(span.latency for span in spans)),
+        }
+
+    try:
+        # The first run doubles as warm-up (imports, connection pool) and the memory measurement,
+        # since tracemalloc slows everything down too much to time the same run.
+        tracemalloc.start()
+        run_once()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        runs = [run_once() for _ in range(repeat)]
+    finally:
+        timer.restore()
+
+    median_run = sorted(runs, key=lambda run: run["wall_s"])[len(runs) // 2]
+    wall = statistics.median(run["wall_s"] for run in runs)
+    return {
+        "description": scenario.description,
+        "repeat": repeat,
+        "wall_s": wall,
+        "wall_min_s": min(run["wall_s"] for run in runs),
+        "overhead_s": statistics.median(run["overhead_s"] for run in runs),
+        "peak_mem_mb": peak / (1024 * 1024),
+        "runs_per_s": 1.0 / wall if wall else 0.0,
+        "output_tokens_per_s": median_run["output_tokens"] / wall if wall else 0.0,
+        "model_calls": median_run["model_calls"],
+        "http_requests": median_run["http_requests"],
+        "retries": median_run["retries"],
+        "hedges": median_run["hedges"],
+        "searches": median_run["searches"],
+        "stages": median_run["stages"],
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        for metric in COMPARED_METRICS:
+            before, after = previous.get(metric), current.get(metric)
+            # Sub-millisecond values are dominated by timer noise.
+            if not before or after is None or before < 0.001:
+                continue
+            change = after / before - 1.0
+            current.setdefault("change", {})[metric] = change
+            if change > threshold:
+                regressions.append(f"{name}.{metric}: {before:.4f} -> {after:.4f} (+{change:.0%})")
+    return regressions
+
+def print_report(results: Dict[str, Any]) -> None:
+    from rich.console import Console
+    from rich.table import Table
+
+    console = Console()
+    table = Table(title="Benchmark Results", title_justify="left")
+    for column in ["Scenario", "Wall s", "Overhead s", "Peak MB", "Runs/s", "Out tok/s", "Calls", "Searches", "Change"]:
+        table.add_column(column, justify="left" if column in ("Scenario", "Change") else "right")
+    for name, result in results["scenarios"].items():
+        change = ", ".join(f"{metric} {value:+.0%}" for metric, value in result.get("change", {}).items()) or "-"
+        table.add_row(name, f"{result['wall_s']:.3f}", f"{result['overhead_s']:.3f}", f"{result['peak_mem_mb']:.1f}",
+                      f"{result['runs_per_s']:.2f}", f"{result['output_tokens_per_s']:.0f}", str(result["model_calls"]),
+                      str(result["searches"]), change)
+    console.print(table)
+
+    stage_table = Table(title="Per-Stage Time (s, median run)", title_justify="left")
+    stage_names = sorted({stage for result in results["scenarios"].values() for stage in result["stages"]})
+    stage_table.add_column("Scenario")
+    for stage in stage_names:
+        stage_table.add_column(stage, justify="right")
+    for name, result in results["scenarios"].items():
+        stage_table.add_row(name, *(f"{result['stages'][stage]:.3f}" if stage in result["stages"] else "-" for stage in stage_names))
+    console.print(stage_table)
+
+def configure_environment(base_url: str, workdir: str) -> None:
+    # Settings are read on first use and then kept, so everything has to be in place before the framework runs.
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    os.environ["TAVILY_BASE_URL"] = base_url
+    os.environ["LOG_FILE"] = os.path.join(workdir, "app.log")
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the framework's own overhead against a local mock API")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run (default: all of {', '.join(s.name for s in SCENARIOS)})")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per scenario; the median is reported")
+    parser.add_argument("--ttft", type=float, default=0.0, help="Simulated seconds before the first token of each response")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Simulated output pacing (0 for instant responses)")
+    parser.add_argument("--transcript", help="JSON file mapping roles to recorded response texts to replay instead of synthetic ones")
+    parser.add_argument("--output", help="Write results as JSON to this file (use it as a later --baseline)")
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown or memory growth that counts as a regression")
+    parser.add_argument("--verbose", action="store_true", help="Show the framework's console output")
+    args = parser.parse_args()
+
+    selected = [scenario for scenario in SCENARIOS if not args.scenarios or scenario.name in args.scenarios]
+    unknown = set(args.scenarios) - {scenario.name for scenario in SCENARIOS}
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    transcript = load_transcript(args.transcript) if args.transcript else None
+    for scenario in selected:
+        scenario.mock.ttft = args.ttft
+        scenario.mock.tokens_per_second = args.tokens_per_second
+        scenario.mock.transcript = transcript
+
+    mock = MockAnthropic()
+    server = MockServer(mock).start()
+    # One loop for every run: the pooled client's keep-alive connections are bound to the loop that opened them.
+    loop = asyncio.new_event_loop()
+    with tempfile.TemporaryDirectory(prefix="agentic-bench-") as workdir:
+        configure_environment(server.url, workdir)
+        if not args.verbose:
+            # The HTTP client logs every request at INFO, which would drown out the report.
+            logging.disable(logging.INFO)
+        results: Dict[str, Any] = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scenarios": {},
+        }
+        try:
+            for scenario in selected:
+                print(f"Running {scenario.name}: {scenario.description}", file=sys.stderr)
+                results["scenarios"][scenario.name] = run_scenario(loop, scenario, mock, workdir, args.repeat, args.verbose)
+        finally:
+            loop.close()
+            server.stop()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if regressions:
+        print("Regressions against baseline:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        sys.exit(1)
@@ -1,4 +1,6 @@
+from typing import Any, Optional
 from pydantic_settings import BaseSettings
+from constants import DEFAULT_DAEMON_SOCKET_PATH
 
 class Settings(BaseSettings):
     # Anthropic API settings
@@ -8,6 +10,16 @@ class Settings(BaseSettings):
     REFINER_MODEL: str = "claude-3-opus-20240229"
     TAVILY_API_KEY: str
 
+    # API endpoint overrides (e.g. a proxy or the local benchmark mock server)
+    ANTHROPIC_BASE_URL: Optional[str] = None
+    TAVILY_BASE_URL: Optional[str] = None
+
+    # HTTP connection pool settings for the shared async Anthropic client
+    ANTHROPIC_MAX_CONNECTIONS: int = 100
+    ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    ANTHROPIC_KEEPALIVE_EXPIRY: float = 30.0
+    ANTHROPIC_TIMEOUT: float = 600.0
+
     # Logging settings
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "app.log"
@@ -16,11 +28,105 @@ class Settings(BaseSettings):
     TIMESTAMP_FORMAT: str = "%Y-%m-%d_%H-%M-%S"
     MAX_OBJECTIVE_LENGTH: int = 50
 
-    # Retry settings
+    # Plan-ahead (DAG) mode settings
+    MAX_CONCURRENT_SUBTASKS: int = 4
+    MAX_PLAN_ROUNDS: int = 5
+
+    # Context management settings
+    CONTEXT_TOKEN_BUDGET: int = 24000
+    CONTEXT_MIN_RECENT: int = 2
+    CONTEXT_SUMMARY_MODEL: str = "claude-3-haiku-20240307"
+    CONTEXT_SUMMARY_MAX_TOKENS: int = 1024
+
+    # Batch runner settings
+    BATCH_CONCURRENCY: int = 8
+    BATCH_REQUESTS_PER_MINUTE: float = 50.0
+    BATCH_TOKENS_PER_MINUTE: float = 40000.0
+
+    # Response cache settings
+    RESPONSE_CACHE_PATH: str = ".cache/responses.sqlite3"
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Continuation settings
+    MAX_CONTINUATION_ROUNDS: int = 3
+
+    # Search cache settings
+    SEARCH_CACHE_PATH: str = ".cache/search.sqlite3"
+    SEARCH_CACHE_TTL: float = 86400.0
+
+    # Large-input (chunked map-reduce) settings
+    LARGE_INPUT_THRESHOLD_TOKENS: int = 50000
+    LARGE_INPUT_CHUNK_TOKENS: int = 8000
+    LARGE_INPUT_DIGEST_TOKENS: int = 8000
+    LARGE_INPUT_PARTIAL_MAX_TOKENS: int = 1024
+    LARGE_INPUT_CONCURRENCY: int = 8
+    LARGE_INPUT_MODEL: str = "claude-3-haiku-20240307"
+
+    # Hierarchical refinement settings (used when the sub-task results outgrow one refiner prompt)
+    REFINER_TREE_THRESHOLD_TOKENS: int = 24000
+    REFINER_GROUP_TOKENS: int = 12000
+    REFINER_MERGE_MAX_TOKENS: int = 4096
+    REFINER_MERGE_CONCURRENCY: int = 8
+    REFINER_MERGE_MODEL: str = "claude-3-haiku-20240307"
+
+    # Model router settings (--route): comma-separated tiers from cheapest to strongest
+    ROUTER_TIERS: str = "claude-3-haiku-20240307,claude-3-sonnet-20240229,claude-3-opus-20240229"
+    ROUTER_LARGE_PROMPT_TOKENS: int = 6000
+    ROUTER_MIN_SAMPLES: int = 5
+    ROUTER_MAX_FAILURE_RATE: float = 0.3
+    ROUTER_HISTORY_PATH: str = ".cache/router.json"
+
+    # Sub-task result reuse settings (--reuse): Jaccard similarity of prompts, from 0 to 1
+    REUSE_INDEX_PATH: str = ".cache/reuse.sqlite3"
+    REUSE_MAX_ENTRIES: int = 20000
+    REUSE_DIRECT_SIMILARITY: float = 0.9
+    REUSE_CONTEXT_SIMILARITY: float = 0.5
+    REUSE_MAX_CONTEXT_RESULTS: int = 1
+
+    # Project materialization settings
+    MATERIALIZE_WORKERS: int = 8
+
+    # Run journal (checkpoint/resume) settings
+    JOURNAL_DIR: str = ".cache/runs"
+
+    # Retry and resilience settings (RETRY_DELAY is the base of the jittered exponential backoff)
     RETRY_ATTEMPTS: int = 5
-    RETRY_DELAY: int = 10
+    RETRY_DELAY: float = 1.0
+    RETRY_MAX_DELAY: float = 60.0
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_SECONDS: float = 30.0
+    GOVERNOR_MAX_CONCURRENCY: int = 32
+    GOVERNOR_MIN_CONCURRENCY: int = 1
+    HEDGE_REQUESTS: bool = False
+    HEDGE_PERCENTILE: float = 0.95
+    HEDGE_MIN_SAMPLES: int = 20
+
+    # Daemon mode settings (daemon.py and daemon_client.py)
+    DAEMON_SOCKET_PATH: str = DEFAULT_DAEMON_SOCKET_PATH
 
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+class LazySettings:
+    """Stands in for ``Settings`` and builds it on first use.
+
+    Importing config then reads neither the environment nor ``.env``, so
+    ``--help`` works without API keys and imports stay cheap.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, "_settings", None)
+
+    def _load(self) -> Settings:
+        if self._settings is None:
+            object.__setattr__(self, "_settings", Settings())
+        return self._settings
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._load(), name, value)
+
+settings = LazySettings()
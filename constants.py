@@ -0,0 +1,3 @@
+# Values shared with daemon_client.py, which must not import config: pydantic_settings alone takes longer to load than the client needs to run.
+MODELS = ["claude-3-opus-20240229", "claude-3-haiku-20240307", "claude-3-sonnet-20240229"]
+DEFAULT_DAEMON_SOCKET_PATH = ".cache/agentic.sock"
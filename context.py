@@ -0,0 +1,97 @@
+from typing import Dict, List, Optional, Tuple
+from events import emit
+from base_agent import BaseAgent, AnthropicClient
+from cache import ResponseCache
+from ratelimit import RateLimiter
+from exceptions import APIError, CacheMissError
+from tokens import estimate_tokens
+
+class ContextSummarizer(BaseAgent):
+    role = "context_summarizer"
+
+    def __init__(self, anthropic_client: AnthropicClient, model: str, response_cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
+        super().__init__(anthropic_client, model, response_cache, rate_limiter=rate_limiter)
+
+    async def summarize_async(self, summary: str, exchanges: List[Tuple[str, str]], max_tokens: int) -> str:
+        exchanges_text = "\n\n".join(f"Task: {task}\nResult: {result}" for task, result in exchanges)
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text",
+                     "text": "You maintain a rolling summary of the work done so far on a multi-step objective. Update the current summary so it also covers the new task results below. Keep every decision, fact, file name, interface and open issue a later step could depend on, drop repetition and pleasantries, and reply with the updated summary only.\n\n"
+                             f"Current summary:\n{summary or 'None'}\n\nNew task results:\n{exchanges_text}"}
+                ]
+            }
+        ]
+
+        try:
+            response = await self._create_message(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=messages
+            )
+        except CacheMissError:
+            raise
+        except Exception as e:
+            emit("error", f"Error in calling Context Summarizer: [bold]{str(e)}[/bold]", title="Context Summarizer Error", style="red", role=self.role)
+            raise APIError(f"Error in calling Anthropic API: {str(e)}") from e
+
+        total_cost = self._track_cost(response)
+        emit("cost", f"Folded {len(exchanges)} earlier task(s) into the rolling summary. Summary Cost: ${total_cost:.4f}", role=self.role,
+             cost=total_cost, folded=len(exchanges))
+        return response.content[0].text.strip()
+
+class ContextManager:
+    """Bounded history of sub-task exchanges for the orchestrator and sub-agent prompts.
+
+    Recent exchanges are kept verbatim; once they exceed ``token_budget`` the oldest
+    ones are folded into an incrementally updated rolling summary, so prompt size
+    stays flat instead of growing with every iteration.
+    """
+
+    def __init__(self, summarizer: ContextSummarizer, token_budget: int, min_recent: int, summary_max_tokens: int):
+        self.summarizer = summarizer
+        self.token_budget = token_budget
+        self.min_recent = min_recent
+        self.summary_max_tokens = summary_max_tokens
+        self.summary = ""
+        self.summarized_count = 0
+        self.recent: List[Tuple[str, str]] = []
+
+    @property
+    def total_cost(self) -> float:
+        return self.summarizer.total_cost
+
+    def restore(self, summary: str, summarized_count: int, exchanges: List[Tuple[str, str]]) -> None:
+        # Exchanges are folded into the summary oldest first, so everything past the summarized prefix is still recent.
+        self.summary = summary
+        self.summarized_count = summarized_count
+        self.recent = list(exchanges[summarized_count:])
+
+    def add(self, task: str, result: str) -> None:
+        self.recent.append((task, result))
+
+    def token_count(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(task) + estimate_tokens(result) for task, result in self.recent)
+
+    async def compact_async(self) -> None:
+        evicted: List[Tuple[str, str]] = []
+        while len(self.recent) > self.min_recent and self.token_count() > self.token_budget:
+            evicted.append(self.recent.pop(0))
+        if evicted:
+            self.summary = await self.summarizer.summarize_async(self.summary, evicted, self.summary_max_tokens)
+            self.summarized_count += len(evicted)
+
+    def previous_results(self) -> List[str]:
+        results = [result for _, result in self.recent]
+        if self.summary:
+            results.insert(0, f"Summary of the first {self.summarized_count} sub-task results:\n{self.summary}")
+        return results
+
+    def previous_tasks(self) -> List[Dict[str, str]]:
+        tasks = [{"task": task, "result": result} for task, result in self.recent]
+        if self.summary:
+            tasks.insert(0, {"task": f"Summary of the first {self.summarized_count} tasks", "result": self.summary})
+        return tasks
@@ -0,0 +1,64 @@
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from anthropic.types import Message
+from events import emit
+
+# Shorter suffix/prefix matches are too likely to be coincidental (e.g. a shared "the ").
+MIN_OVERLAP_CHARS = 16
+MAX_OVERLAP_CHARS = 500
+
+@dataclass
+class Completion:
+    text: str
+    responses: List[Message] = field(default_factory=list)
+
+    @property
+    def stop_reason(self) -> Optional[str]:
+        return self.responses[-1].stop_reason if self.responses else None
+
+    @property
+    def input_tokens(self) -> int:
+        return sum(response.usage.input_tokens for response in self.responses)
+
+    @property
+    def output_tokens(self) -> int:
+        return sum(response.usage.output_tokens for response in self.responses)
+
+    @property
+    def truncated(self) -> bool:
+        return self.stop_reason == "max_tokens"
+
+def response_text(response: Message) -> str:
+    return "".join(block.text for block in response.content if getattr(block, "type", None) == "text")
+
+def stitch_continuation(partial: str, continuation: str) -> str:
+    # A prefilled turn continues mid-stream, but models occasionally restate the last
+    # few words; drop the longest suffix of ``partial`` that ``continuation`` repeats.
+    longest = min(len(partial), len(continuation), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if partial.endswith(continuation[:size]):
+            return partial + continuation[size:]
+    return partial + continuation
+
+async def complete_with_continuation(create: Callable[..., Awaitable[Message]], max_rounds: int, **kwargs: Any) -> Completion:
+    """Call ``create`` and, while the response stops on ``max_tokens``, continue it by prefilling the partial answer.
+
+    Every round resends the original request plus the stitched text so far as the
+    start of the assistant turn, so the model picks up exactly where it stopped.
+    """
+    messages: List[Dict[str, Any]] = kwargs.pop("messages")
+    completion = Completion(text="")
+    for round_number in range(max_rounds + 1):
+        # The API rejects a final assistant turn that ends in whitespace.
+        prefill = completion.text.rstrip()
+        request_messages = messages + [{"role": "assistant", "content": prefill}] if prefill else messages
+        response = await create(messages=request_messages, **kwargs)
+        completion.responses.append(response)
+        completion.text = stitch_continuation(prefill, response_text(response)) if prefill else response_text(response)
+        if response.stop_reason != "max_tokens":
+            break
+        if round_number < max_rounds:
+            emit("warning", f"[bold yellow]Warning:[/bold yellow] Output hit the token limit. Continuing the response (round {round_number + 1} of {max_rounds}).")
+    else:
+        emit("warning", f"[bold yellow]Warning:[/bold yellow] Output still truncated after {max_rounds} continuation rounds.")
+    return completion
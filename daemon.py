@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import signal
+import socket
+from dataclasses import asdict
+from typing import Any, Dict, Optional, Set, Tuple
+from config import settings
+from constants import MODELS
+from events import Event, JsonlSink, configure_logging, emit, event_record, get_event_bus
+from exceptions import ConfigurationError, FileIOError
+from utils import extract_file_path
+
+logger = logging.getLogger(__name__)
+
+# The (loop, queue) of the client connection whose run is executing; tasks and to_thread workers inherit it.
+_connection: contextvars.ContextVar[Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = contextvars.ContextVar("connection", default=None)
+
+class ConnectionSink:
+    """Forwards each event to the client whose run emitted it, so concurrent runs never see each other's output."""
+
+    def handle(self, event: Event) -> None:
+        target = _connection.get()
+        if target is None:
+            return
+        loop, queue = target
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            queue.put_nowait(event)
+        else:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def close(self) -> None:
+        pass
+
+def _message(event: Event) -> Dict[str, Any]:
+    if event.kind == "text_delta":
+        return {"type": "event", "kind": "text_delta", "message": event.message}
+    return {"type": "event", **event_record(event)}
+
+def claim_socket(path: str) -> None:
+    """Remove a socket file left behind by a daemon that died, refusing if one is still listening."""
+    if not os.path.exists(path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise ConfigurationError(f"A daemon is already listening on {path}")
+
+class Daemon:
+    """Serves objectives over a Unix socket from one warm process.
+
+    The pooled Anthropic client, response cache, search cache, model router and
+    reuse index are created once and shared by every run, so a request skips the
+    interpreter and SDK start-up and reuses open keep-alive connections. Each
+    connection sends one JSON request line and receives its run's events as JSON
+    lines, followed by a ``result`` line.
+    """
+
+    def __init__(self, socket_path: str, cache: bool = False, reuse: bool = False, metrics_prom: Optional[str] = None):
+        from main import create_router
+        from cache import ResponseCache
+        from reuse import ReuseIndex
+        from dependencies import get_async_anthropic_client
+
+        self.socket_path = socket_path
+        self.metrics_prom = metrics_prom
+        self.anthropic_client = get_async_anthropic_client()
+        self.response_cache = ResponseCache(settings.RESPONSE_CACHE_PATH, settings.RESPONSE_CACHE_MAX_ENTRIES,
+                                            settings.RESPONSE_CACHE_MAX_BYTES) if cache else None
+        self.reuse_index = ReuseIndex(settings.REUSE_INDEX_PATH, settings.REUSE_MAX_ENTRIES) if reuse else None
+        self._create_router = create_router
+        self._router = None
+        self._search_service = None
+        self._runs: Set[asyncio.Task] = set()
+
+    def router(self) -> Any:
+        if self._router is None:
+            self._router = self._create_router()
+        return self._router
+
+    def search_service(self) -> Any:
+        # Built on the first search request; shared afterwards so searches are cached and coalesced across runs.
+        if self._search_service is None:
+            from search import SearchService
+            from dependencies import get_tavily_client
+
+            self._search_service = SearchService(get_tavily_client(), settings.SEARCH_CACHE_PATH, settings.SEARCH_CACHE_TTL)
+        return self._search_service
+
+    async def _run(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        from main import async_main
+        from journal import RunJournal
+
+        if request.get("resume"):
+            try:
+                journal = RunJournal.open(settings.JOURNAL_DIR, request["resume"])
+            except FileIOError as e:
+                return {"type": "error", "error": str(e)}
+            params = journal.state.params
+            emit("resume", f"Resuming run [bold]{journal.run_id}[/bold] with {len(journal.state.exchanges)} completed sub-task(s)",
+                 title="Resume", style="blue", run_id=journal.run_id)
+        else:
+            objective, file_path = request["objective"], request.get("file")
+            if file_path:
+                # Drop the path from the objective as the user typed it, as main.py does, then resolve it against the client's directory.
+                objective = extract_file_path(objective, file_path)
+                file_path = os.path.join(request.get("cwd") or os.getcwd(), file_path)
+            params = {"objective": objective, "file_path": file_path, "use_search": bool(request.get("search")),
+                      "model": request.get("model"), "cost_limit": float(request.get("cost_limit") or 0.0), "plan_mode": bool(request.get("plan")),
+                      "max_concurrency": request.get("max_concurrency"), "large_input": bool(request.get("large_input")),
+                      "route": bool(request.get("route"))}
+            journal = RunJournal.create(settings.JOURNAL_DIR, params)
+            # Projects, exchange logs and journals go to the daemon's directory, whichever directory the client runs in.
+            emit("run_started", f"Run ID: [bold]{journal.run_id}[/bold] (continue an interrupted run with --resume {journal.run_id}); "
+                 f"outputs are written to {os.getcwd()}", run_id=journal.run_id, output_dir=os.getcwd())
+        try:
+            result = await async_main(self.anthropic_client, None, params["objective"], params["file_path"], params["use_search"],
+                                      params["model"], params["cost_limit"], plan_mode=params["plan_mode"],
+                                      max_concurrency=params["max_concurrency"], response_cache=self.response_cache,
+                                      stream=bool(request.get("stream")),
+                                      search_service=self.search_service() if params["use_search"] else None, journal=journal,
+                                      large_input=params.get("large_input", False), router=self.router() if params.get("route") else None,
+                                      reuse_index=self.reuse_index)
+        finally:
+            journal.close()
+        if self.metrics_prom:
+            from telemetry import get_telemetry
+            get_telemetry().export_prometheus(self.metrics_prom)
+        return {"type": "result", **asdict(result)}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            # readline raises ValueError for a line longer than the stream limit, which is answered like any other bad request.
+            line = await reader.readline()
+            if not line.strip():
+                # A liveness probe, such as claim_socket from a second daemon.
+                writer.close()
+                return
+            request = json.loads(line)
+            if not isinstance(request, dict) or not (request.get("objective") or request.get("resume")):
+                raise ValueError("an objective is required unless resume is given")
+            if request.get("model") and request["model"] not in MODELS:
+                raise ValueError(f"unknown model {request['model']}")
+        except ValueError as e:
+            writer.write((json.dumps({"type": "error", "error": f"Bad request: {e}"}) + "\n").encode("utf-8"))
+            writer.close()
+            return
+        except ConnectionError:
+            writer.close()
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        token = _connection.set((asyncio.get_running_loop(), queue) if request.get("events", True) else None)
+        try:
+            run = asyncio.create_task(self._run(request))
+        finally:
+            _connection.reset(token)
+        self._runs.add(run)
+        run.add_done_callback(self._runs.discard)
+        run.add_done_callback(lambda _: queue.put_nowait(None))
+        logger.info(f"Accepted objective: {request.get('objective') or 'resume ' + request['resume']}")
+        try:
+            while (event := await queue.get()) is not None:
+                writer.write((json.dumps(_message(event), default=str) + "\n").encode("utf-8"))
+                await writer.drain()
+            try:
+                response = run.result()
+            except asyncio.CancelledError:
+                response = {"type": "error", "error": "The daemon shut down before the run finished"}
+            except Exception as e:
+                logger.exception("Run failed")
+                response = {"type": "error", "error": f"{type(e).__name__}: {e}"}
+            writer.write((json.dumps(response, default=str) + "\n").encode("utf-8"))
+            await writer.drain()
+        except ConnectionError:
+            # The client went away; its journal lets it pick the run up again with resume.
+            logger.warning("Client disconnected; cancelling its run")
+            run.cancel()
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        claim_socket(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        # Anyone who can connect can spend API credit, so only the owner may.
+        os.chmod(self.socket_path, 0o600)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        logger.info(f"Daemon listening on {self.socket_path} (pid {os.getpid()}); outputs are written to {os.getcwd()}")
+        try:
+            await stop.wait()
+        finally:
+            server.close()
+            for run in list(self._runs):
+                run.cancel()
+            await asyncio.gather(*self._runs, return_exceptions=True)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            for store in (self.response_cache, self.reuse_index, self._search_service):
+                if store is not None:
+                    store.close()
+            await self.anthropic_client.close()
+            logger.info("Daemon stopped")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the framework warm and serve objectives over a Unix socket (see daemon_client.py)")
+    parser.add_argument("--socket", help="Unix socket path (default: DAEMON_SOCKET_PATH)")
+    parser.add_argument("--cache", action="store_true", help="Reuse cached model responses for identical requests")
+    parser.add_argument("--reuse", action="store_true", help="Reuse results of similar sub-tasks across runs")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Send a duplicate of any non-streamed call still running past the p95 latency of its role and model")
+    parser.add_argument("--metrics-prom", help="Rewrite aggregated call metrics to this Prometheus textfile after every run")
+    parser.add_argument("--events-jsonl", help="Also append every run's events to this JSONL file")
+    parser.add_argument("--quiet", action="store_true", help="Don't echo log records to stderr (the log file is still written)")
+    args = parser.parse_args()
+
+    configure_logging(settings.LOG_LEVEL, settings.LOG_FILE, to_console=not args.quiet)
+    get_event_bus().configure([ConnectionSink()] + ([JsonlSink(args.events_jsonl)] if args.events_jsonl else []))
+    if args.hedge:
+        from resilience import enable_hedging
+        enable_hedging()
+    daemon = Daemon(args.socket or settings.DAEMON_SOCKET_PATH, args.cache, args.reuse, args.metrics_prom)
+    try:
+        asyncio.run(daemon.serve())
+    except ConfigurationError as e:
+        parser.error(str(e))
@@ -0,0 +1,69 @@
+"""Thin client for daemon.py. It imports only the standard library and constants.py, so it starts in milliseconds."""
+import argparse
+import json
+import os
+import socket
+import sys
+from constants import DEFAULT_DAEMON_SOCKET_PATH, MODELS
+
+def print_event(message: dict) -> None:
+    if message.get("kind") == "text_delta":
+        sys.stdout.write(message["message"])
+        sys.stdout.flush()
+    elif message.get("title"):
+        print(f"\n== {message['title']} ==\n{message['message']}")
+    elif message.get("message"):
+        print(message["message"])
+
+def run(socket_path: str, request: dict, quiet: bool) -> int:
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"No daemon is listening on {socket_path}; start one with: python daemon.py", file=sys.stderr)
+        return 2
+    with client, client.makefile('rb') as stream:
+        client.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        for line in stream:
+            message = json.loads(line)
+            if message["type"] == "event":
+                if not quiet:
+                    print_event(message)
+            elif message["type"] == "result":
+                if quiet:
+                    print(json.dumps(message))
+                elif message.get("status") != "completed" and message.get("run_id"):
+                    print(f"Run {message['status']}. Continue with: python daemon_client.py --resume {message['run_id']}")
+                return 0 if message.get("status") == "completed" else 1
+            else:
+                print(f"Error: {message.get('error')}", file=sys.stderr)
+                return 1
+    print("The daemon closed the connection before the run finished", file=sys.stderr)
+    return 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send an objective to a running daemon.py and stream its progress",
+                                     epilog="A relative --file is read from this directory. Generated projects, exchange logs and run "
+                                            "journals are written to the daemon's working directory.")
+    parser.add_argument("objective", nargs="?", help="The objective to achieve")
+    parser.add_argument("--file", help="Path to a file to include in the objective")
+    parser.add_argument("--search", action="store_true", help="Enable search functionality")
+    parser.add_argument("--model", choices=MODELS, help="Override the model for every role (default: per-role models from settings)")
+    parser.add_argument("--cost-limit", type=float, default=0.0, help="Stop after this many dollars have been spent (0 means no limit)")
+    parser.add_argument("--plan", action="store_true", help="Plan the whole task as a dependency graph and run independent sub-tasks concurrently")
+    parser.add_argument("--max-concurrency", type=int, help="Maximum number of sub-tasks run at once in --plan mode")
+    parser.add_argument("--large-input", action="store_true", help="Digest --file with the chunked map-reduce pipeline")
+    parser.add_argument("--route", action="store_true", help="Pick each sub-task's model with the adaptive router")
+    parser.add_argument("--stream", action="store_true", help="Stream model output as it is generated")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Continue an interrupted run from its journal")
+    parser.add_argument("--socket", help=f"Daemon socket path (default: DAEMON_SOCKET_PATH or {DEFAULT_DAEMON_SOCKET_PATH})")
+    parser.add_argument("--quiet", action="store_true", help="Print only the final result, as JSON")
+    args = parser.parse_args()
+    if not args.objective and not args.resume:
+        parser.error("an objective is required unless --resume is given")
+
+    request = {"objective": args.objective, "file": args.file, "cwd": os.getcwd(), "search": args.search,
+               "model": args.model, "cost_limit": args.cost_limit, "plan": args.plan, "max_concurrency": args.max_concurrency,
+               "large_input": args.large_input, "route": args.route, "stream": args.stream, "resume": args.resume,
+               "events": not args.quiet}
+    sys.exit(run(args.socket or os.environ.get("DAEMON_SOCKET_PATH", DEFAULT_DAEMON_SOCKET_PATH), request, args.quiet))
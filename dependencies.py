@@ -1,12 +1,17 @@
-from anthropic import Anthropic
-from tavily import TavilyClient
+from functools import lru_cache
+from anthropic import Anthropic, AsyncAnthropic, DefaultAsyncHttpxClient, DEFAULT_CONNECTION_LIMITS
+from typing import TYPE_CHECKING
 from config import settings
 from exceptions import ConfigurationError
 
+if TYPE_CHECKING:
+    from tavily import TavilyClient
+
 def get_anthropic_client() -> Anthropic:
     try:
         api_key = settings.ANTHROPIC_API_KEY
-        anthropic_client = Anthropic(api_key=api_key)
+        # Retries are handled by resilience.call_with_retries; SDK retries on top would multiply them.
+        anthropic_client = Anthropic(api_key=api_key, base_url=settings.ANTHROPIC_BASE_URL, max_retries=0)
         anthropic_client.api_url = "https://api.anthropic.com/v1/messages"
         anthropic_client.headers = {
             "anthropic-version": "2023-06-01",
@@ -16,10 +21,28 @@ def get_anthropic_client() -> Anthropic:
     except Exception as e:
         raise ConfigurationError(f"Error configuring Anthropic client: {str(e)}") from e
 
-def get_tavily_client() -> TavilyClient:
+@lru_cache(maxsize=None)
+def get_async_anthropic_client() -> AsyncAnthropic:
+    # One client per process so every agent and objective shares the same keep-alive pool.
+    try:
+        limits = type(DEFAULT_CONNECTION_LIMITS)(
+            max_connections=settings.ANTHROPIC_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.ANTHROPIC_KEEPALIVE_EXPIRY,
+        )
+        http_client = DefaultAsyncHttpxClient(limits=limits)
+        return AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY, base_url=settings.ANTHROPIC_BASE_URL, http_client=http_client,
+                              timeout=settings.ANTHROPIC_TIMEOUT, max_retries=0)
+    except Exception as e:
+        raise ConfigurationError(f"Error configuring async Anthropic client: {str(e)}") from e
+
+def get_tavily_client() -> "TavilyClient":
+    # Imported here so runs without --search never load the Tavily SDK.
+    from tavily import TavilyClient
+
     try:
         api_key = settings.TAVILY_API_KEY
-        tavily_client = TavilyClient(api_key=api_key)
+        tavily_client = TavilyClient(api_key=api_key, api_base_url=settings.TAVILY_BASE_URL)
         return tavily_client
     except Exception as e:
-        raise ConfigurationError(f"Error configuring Tavily client: {str(e)}") from e
\ No newline at end of file
+        raise ConfigurationError(f"Error configuring Tavily client: {str(e)}") from e
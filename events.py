@@ -0,0 +1,139 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+@dataclass
+class Event:
+    """One unit of progress output. ``message`` is rich markup, or a rich renderable such as a Table."""
+    kind: str
+    message: Any = ""
+    title: Optional[str] = None
+    style: Optional[str] = None
+    subtitle: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+class RichSink:
+    """Renders events to the terminal the way the framework always has: panels, coloured lines and tables.
+
+    rich is imported on the first event, so headless runs never load it.
+    """
+
+    def __init__(self, console: Any = None):
+        self.console = console
+
+    def handle(self, event: Event) -> None:
+        if self.console is None:
+            from rich.console import Console
+            self.console = Console()
+        if event.kind == "text_delta":
+            self.console.print(event.message, end="", markup=False, highlight=False, soft_wrap=True)
+        elif event.title is not None:
+            from rich.panel import Panel
+            title = f"[bold {event.style}]{event.title}[/bold {event.style}]" if event.style else event.title
+            self.console.print(Panel(event.message, title=title, title_align="left", border_style=event.style or "none", subtitle=event.subtitle))
+        else:
+            self.console.print(event.message, style=event.style)
+
+    def close(self) -> None:
+        pass
+
+def plain_text(message: Any) -> str:
+    """``message`` without rich markup; renderables such as tables come out empty and travel in the event's data instead."""
+    from rich.errors import MarkupError
+    from rich.text import Text
+
+    if not isinstance(message, str):
+        return ""
+    try:
+        return Text.from_markup(message).plain
+    except MarkupError:
+        return message
+
+def event_record(event: Event) -> Dict[str, Any]:
+    return {"ts": event.timestamp, "kind": event.kind, "title": event.title, "message": plain_text(event.message), **event.data}
+
+class JsonlSink:
+    """Appends one JSON object per event to ``path``; text deltas are skipped since the full text follows as its own event."""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'a', buffering=1024 * 1024)
+        self._lock = threading.Lock()
+
+    def handle(self, event: Event) -> None:
+        if event.kind == "text_delta":
+            return
+        line = json.dumps(event_record(event), default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+class EventBus:
+    """Fans progress events out to pluggable sinks. With no sinks, emitting is a no-op."""
+
+    def __init__(self, sinks: Optional[List[Any]] = None):
+        self.sinks: List[Any] = list(sinks) if sinks is not None else [RichSink()]
+
+    def configure(self, sinks: List[Any]) -> None:
+        self.close()
+        self.sinks = list(sinks)
+
+    def emit(self, event: Event) -> None:
+        for sink in self.sinks:
+            sink.handle(event)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+_bus = EventBus()
+
+def get_event_bus() -> EventBus:
+    return _bus
+
+def has_sinks() -> bool:
+    """Whether anything listens; lets callers skip building output, such as summary tables, that would be dropped."""
+    return bool(_bus.sinks)
+
+def emit(kind: str, message: Any = "", title: Optional[str] = None, style: Optional[str] = None, subtitle: Optional[str] = None,
+         **data: Any) -> None:
+    # Checked before building the Event so headless runs pay nothing per call.
+    if _bus.sinks:
+        _bus.emit(Event(kind, message, title, style, subtitle, data))
+
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure_logging(level: str, log_file: str, to_console: bool = True) -> None:
+    """Route the root logger through a queue so file and stream writes happen on a background thread."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+    handlers: List[logging.Handler] = [logging.FileHandler(log_file)]
+    if to_console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter("%(message)s"))
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+
+def _stop_logging() -> None:
+    if _log_listener is not None:
+        _log_listener.stop()
+    _bus.close()
+
+atexit.register(_stop_logging)
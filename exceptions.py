@@ -5,4 +5,13 @@ class FileIOError(Exception):
     """Custom exception class for file I/O errors."""
 
 class ConfigurationError(Exception):
-    """Custom exception class for configuration-related errors."""
\ No newline at end of file
+    """Custom exception class for configuration-related errors."""
+
+class PlanError(Exception):
+    """Custom exception class for malformed or unschedulable sub-task plans."""
+
+class CacheMissError(Exception):
+    """Custom exception class for response cache misses in replay mode."""
+
+class CircuitOpenError(Exception):
+    """Custom exception class for calls failed fast while a service's circuit breaker is open."""
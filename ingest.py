@@ -0,0 +1,198 @@
+import asyncio
+import mmap
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from events import emit
+from base_agent import BaseAgent, AnthropicClient
+from cache import ResponseCache
+from ratelimit import RateLimiter
+from exceptions import APIError, CacheMissError, FileIOError
+from tokens import CHARS_PER_TOKEN, estimate_tokens, group_by_budget
+
+CODE_EXTENSIONS = {".py", ".js", ".jsx", ".ts", ".tsx", ".go", ".rs", ".java", ".kt", ".scala", ".c", ".h", ".cc", ".cpp", ".hpp",
+                   ".cs", ".rb", ".php", ".swift", ".sh", ".sql"}
+TABLE_EXTENSIONS = {".csv", ".tsv"}
+RECORD_EXTENSIONS = {".log", ".jsonl", ".ndjson"}
+
+# Lines that start a new top-level unit in most languages; chunks prefer to end just before one.
+DEFINITION_PATTERN = re.compile(rb"^(?:async\s+def|def|class|@|function|func|fn|pub|impl|struct|enum|interface|type|export|module|"
+                                rb"public|private|protected|static|package|CREATE|ALTER)\b")
+
+@dataclass
+class Chunk:
+    index: int
+    start: int
+    end: int
+    first_line: int
+    last_line: int
+
+    @property
+    def label(self) -> str:
+        return f"lines {self.first_line}-{self.last_line}"
+
+def detect_kind(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in CODE_EXTENSIONS:
+        return "code"
+    if extension in TABLE_EXTENSIONS:
+        return "table"
+    if extension in RECORD_EXTENSIONS:
+        return "records"
+    return "text"
+
+def is_large_file(path: str, threshold_tokens: int) -> bool:
+    try:
+        return os.path.getsize(path) / CHARS_PER_TOKEN > threshold_tokens
+    except OSError:
+        return False
+
+def _is_boundary(kind: str, line: bytes, previous: bytes) -> bool:
+    if kind in ("table", "records"):
+        return True
+    if not line.strip():
+        return False
+    if kind == "code":
+        return bool(DEFINITION_PATTERN.match(line)) or (not previous.strip() and line[:1] not in b" \t")
+    return not previous.strip() or line.startswith(b"#")
+
+def plan_chunks(path: str, max_tokens: int) -> List[Chunk]:
+    """Split ``path`` into byte ranges of at most ~``max_tokens`` tokens, cutting on structural boundaries.
+
+    Only offsets are kept, so planning a multi-gigabyte file costs one pass over
+    a memory map and no more memory than the chunk list itself.
+    """
+    kind = detect_kind(path)
+    max_bytes = max(1, int(max_tokens * CHARS_PER_TOKEN))
+    chunks: List[Chunk] = []
+    try:
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return chunks
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                line_number = 0
+                if kind == "table":
+                    # The header row is repeated at the top of every chunk instead.
+                    mapped.readline()
+                    line_number = 1
+                chunk_start, chunk_first_line = mapped.tell(), line_number + 1
+                boundary: Optional[Tuple[int, int]] = None
+                previous = b""
+                while True:
+                    line_start = mapped.tell()
+                    line = mapped.readline()
+                    if not line:
+                        break
+                    line_number += 1
+                    starts_unit = _is_boundary(kind, line, previous)
+                    previous = line
+                    if starts_unit and line_start > chunk_start:
+                        boundary = (line_start, line_number)
+                    if mapped.tell() - chunk_start <= max_bytes or line_start == chunk_start:
+                        continue
+                    # Over budget: end the chunk at the last boundary unless that would leave it mostly empty.
+                    if boundary is not None and boundary[0] - chunk_start >= max_bytes // 2:
+                        cut, cut_line = boundary
+                    else:
+                        cut, cut_line = line_start, line_number
+                    chunks.append(Chunk(len(chunks), chunk_start, cut, chunk_first_line, cut_line - 1))
+                    chunk_start, chunk_first_line = cut, cut_line
+                    boundary = (line_start, line_number) if starts_unit and line_start > cut else None
+                if mapped.tell() > chunk_start:
+                    chunks.append(Chunk(len(chunks), chunk_start, mapped.tell(), chunk_first_line, line_number))
+    except (IOError, ValueError) as e:
+        raise FileIOError(f"Error reading file: {path}") from e
+
+    # A single line can still be far over budget (minified code, one-line JSON); split those by size.
+    sized: List[Chunk] = []
+    for chunk in chunks:
+        step = max_bytes if chunk.end - chunk.start > 2 * max_bytes else chunk.end - chunk.start
+        for start in range(chunk.start, chunk.end, step):
+            sized.append(Chunk(len(sized), start, min(start + step, chunk.end), chunk.first_line, chunk.last_line))
+    return sized
+
+def read_chunk(path: str, chunk: Chunk) -> str:
+    try:
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            header = mapped.readline() if detect_kind(path) == "table" else b""
+            return (header + mapped[chunk.start:chunk.end]).decode("utf-8", errors="replace")
+    except (IOError, ValueError) as e:
+        raise FileIOError(f"Error reading file: {path}") from e
+
+class ChunkAnalyst(BaseAgent):
+    role = "chunk_analyst"
+
+    def __init__(self, anthropic_client: AnthropicClient, model: str, response_cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
+        super().__init__(anthropic_client, model, response_cache, rate_limiter=rate_limiter)
+
+    async def _ask(self, prompt: str, max_tokens: int) -> str:
+        try:
+            response = await self._create_message(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": [{"type": "text", "text": prompt}]}]
+            )
+        except CacheMissError:
+            raise
+        except Exception as e:
+            emit("error", f"Error in calling Chunk Analyst: [bold]{str(e)}[/bold]", title="Chunk Analyst Error", style="red", role=self.role)
+            raise APIError(f"Error in calling Anthropic API: {str(e)}") from e
+        self._track_cost(response)
+        return response.content[0].text.strip()
+
+    async def analyze_async(self, objective: str, source: str, chunk: Chunk, total_chunks: int, text: str, max_tokens: int) -> str:
+        notes = await self._ask(
+            f"You are reading part {chunk.index + 1} of {total_chunks} ({chunk.label}) of the file {source}, which is too large to read at once. "
+            "Extract everything in this part that matters for the objective below: names, signatures, data shapes, facts, figures, errors, "
+            "bugs and open questions, with line references. Quote short code or data verbatim where exact text matters. Be concise, skip "
+            "anything irrelevant, and reply with the notes only.\n\n"
+            f"Objective: {objective}\n\nFile part:\n{text}",
+            max_tokens,
+        )
+        return f"[{source} {chunk.label}]\n{notes}"
+
+    async def merge_async(self, objective: str, source: str, partials: List[str], max_tokens: int) -> str:
+        return await self._ask(
+            f"The notes below were extracted from consecutive parts of the file {source} for the objective that follows. Merge them into "
+            "one set of notes: keep every detail and line reference the objective could depend on, combine duplicates, keep verbatim quotes "
+            "intact, and reply with the merged notes only.\n\n"
+            f"Objective: {objective}\n\nNotes:\n" + "\n\n".join(partials),
+            max_tokens,
+        )
+
+async def digest_file(analyst: ChunkAnalyst, objective: str, path: str, chunk_tokens: int, digest_tokens: int, concurrency: int,
+                      partial_max_tokens: int) -> str:
+    """Map-reduce a file that is too large to prompt with directly into a bounded digest.
+
+    Each chunk is analysed by its own concurrent call (map); the partial notes are
+    then merged in a tree of concurrent calls (reduce) until they fit ``digest_tokens``.
+    At most ``concurrency`` chunks are held in memory at once.
+    """
+    source = os.path.basename(path)
+    chunks = plan_chunks(path, chunk_tokens)
+    emit("large_input", f"{path}: {os.path.getsize(path):,} bytes in {len(chunks)} {detect_kind(path)} chunk(s) of up to ~{chunk_tokens:,} tokens",
+         title="Large Input", style="blue", path=path, chunks=len(chunks))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze(chunk: Chunk) -> str:
+        async with semaphore:
+            return await analyst.analyze_async(objective, source, chunk, len(chunks), read_chunk(path, chunk), partial_max_tokens)
+
+    async def merge(group: List[str]) -> str:
+        if len(group) == 1:
+            return group[0]
+        async with semaphore:
+            return await analyst.merge_async(objective, source, group, partial_max_tokens)
+
+    partials = list(await asyncio.gather(*(analyze(chunk) for chunk in chunks)))
+    levels = 0
+    while len(partials) > 1 and sum(estimate_tokens(partial) for partial in partials) > digest_tokens:
+        partials = list(await asyncio.gather(*(merge(group) for group in group_by_budget(partials, chunk_tokens))))
+        levels += 1
+
+    emit("cost", f"Digested {source} from {len(chunks)} chunk(s) in {levels} merge level(s). Large Input Cost: ${analyst.total_cost:.4f}",
+         role=analyst.role, cost=analyst.total_cost, chunks=len(chunks), levels=levels)
+    return (f"Digest of {source} ({os.path.getsize(path):,} bytes). The file is too large to include directly; these notes were "
+            f"extracted from all {len(chunks)} part(s) of it:\n\n" + "\n\n".join(partials))
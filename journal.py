@@ -0,0 +1,168 @@
+import json
+import os
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from events import emit
+from base_agent import BaseAgent
+from scheduler import PlannedSubtask
+from exceptions import FileIOError
+
+@dataclass
+class JournaledPlan:
+    round: int
+    response: str
+    subtasks: List[PlannedSubtask]
+    results: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def open(self) -> bool:
+        # A plan without sub-tasks is the orchestrator declaring the objective complete.
+        return not self.subtasks or any(subtask.id not in self.results for subtask in self.subtasks)
+
+@dataclass
+class JournalState:
+    params: Dict[str, Any] = field(default_factory=dict)
+    digest: Optional[str] = None
+    exchanges: List[Tuple[str, str]] = field(default_factory=list)
+    decision: Optional[Dict[str, Any]] = None
+    plan: Optional[JournaledPlan] = None
+    summary: str = ""
+    summarized_count: int = 0
+    costs: Dict[str, float] = field(default_factory=dict)
+    refined_output: Optional[str] = None
+    completed: bool = False
+
+    def apply(self, record: Dict[str, Any]) -> None:
+        kind = record["type"]
+        if kind == "start":
+            self.params = record["params"]
+        elif kind == "digest":
+            self.digest = record["digest"]
+        elif kind == "decision":
+            self.decision = {"response": record["response"], "search_query": record.get("search_query")}
+        elif kind == "plan":
+            subtasks = [PlannedSubtask(**subtask) for subtask in record["subtasks"]]
+            self.plan = JournaledPlan(round=record["round"], response=record["response"], subtasks=subtasks)
+        elif kind == "result":
+            self.exchanges.append((record["prompt"], record["result"]))
+            self.decision = None
+            if record.get("subtask_id") is not None and self.plan is not None:
+                self.plan.results[record["subtask_id"]] = record["result"]
+        elif kind == "context":
+            self.summary = record["summary"]
+            self.summarized_count = record["summarized_count"]
+        elif kind == "refined":
+            self.refined_output = record["output"]
+        elif kind == "complete":
+            self.completed = True
+        self.costs = record.get("costs", self.costs)
+
+    @property
+    def next_plan_round(self) -> int:
+        return self.plan.round + 1 if self.plan is not None else 0
+
+    def pop_decision(self) -> Optional[Dict[str, Any]]:
+        decision, self.decision = self.decision, None
+        return decision
+
+    def pop_plan(self) -> Optional[JournaledPlan]:
+        plan = self.plan if self.plan is not None and self.plan.open else None
+        if plan is not None:
+            self.plan = None
+        return plan
+
+class RunJournal:
+    """Append-only, fsync'd JSONL write-ahead log of one objective's progress.
+
+    Every large-input digest, orchestrator decision, plan, sub-task result,
+    context summary and the refined output is recorded the moment it is produced,
+    so ``--resume`` can rebuild the run and continue from the last completed step
+    without paying for any model call twice.
+    """
+
+    def __init__(self, path: str, run_id: str, state: JournalState):
+        self.path = path
+        self.run_id = run_id
+        self.state = state
+        self._agents: List[BaseAgent] = []
+        self._file = open(path, 'a')
+
+    @staticmethod
+    def _path(directory: str, run_id: str) -> str:
+        return os.path.join(directory, f"{run_id}.jsonl")
+
+    @classmethod
+    def create(cls, directory: str, params: Dict[str, Any]) -> "RunJournal":
+        os.makedirs(directory, exist_ok=True)
+        run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        journal = cls(cls._path(directory, run_id), run_id, JournalState(params=params))
+        journal._append({"type": "start", "run_id": run_id, "params": params})
+        return journal
+
+    @classmethod
+    def open(cls, directory: str, run_id: str) -> "RunJournal":
+        path = cls._path(directory, run_id)
+        state = JournalState()
+        try:
+            with open(path, 'rb') as file:
+                lines = file.readlines()
+        except IOError as e:
+            raise FileIOError(f"No run journal found for run {run_id} at {path}") from e
+
+        valid_bytes = 0
+        for line_number, line in enumerate(lines, start=1):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                if line_number == len(lines):
+                    # A crash mid-append leaves a torn last line; cut it off so new records start cleanly.
+                    with open(path, 'r+b') as file:
+                        file.truncate(valid_bytes)
+                    break
+                emit("warning", f"[bold yellow]Warning:[/bold yellow] Skipping corrupt journal line {line_number} in {path}")
+                valid_bytes += len(line)
+                continue
+            state.apply(record)
+            valid_bytes += len(line)
+        if not state.params:
+            raise FileIOError(f"Run journal {path} has no start record")
+        return cls(path, run_id, state)
+
+    def attach(self, agents: List[BaseAgent]) -> None:
+        # Restore spend so cost limits and the final total cover the calls made before the resume.
+        for agent in agents:
+            agent.total_cost = self.state.costs.get(agent.role, 0.0)
+        self._agents = agents
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        if self._agents:
+            record["costs"] = {agent.role: agent.total_cost for agent in self._agents}
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record_digest(self, digest: str) -> None:
+        self._append({"type": "digest", "digest": digest})
+
+    def record_decision(self, response: str, search_query: Optional[str]) -> None:
+        self._append({"type": "decision", "response": response, "search_query": search_query})
+
+    def record_plan(self, plan_round: int, response: str, subtasks: List[PlannedSubtask]) -> None:
+        self._append({"type": "plan", "round": plan_round, "response": response, "subtasks": [asdict(subtask) for subtask in subtasks]})
+
+    def record_result(self, prompt: str, result: str, subtask_id: Optional[str] = None) -> None:
+        self._append({"type": "result", "prompt": prompt, "result": result, "subtask_id": subtask_id})
+
+    def record_context(self, summary: str, summarized_count: int) -> None:
+        self._append({"type": "context", "summary": summary, "summarized_count": summarized_count})
+
+    def record_refined(self, output: str) -> None:
+        self._append({"type": "refined", "output": output})
+
+    def record_complete(self) -> None:
+        self._append({"type": "complete"})
+
+    def close(self) -> None:
+        self._file.close()
@@ -1,10 +1,17 @@
+from __future__ import annotations
+
 import argparse
+import asyncio
 import logging
+import sys
 from datetime import datetime
-from rich.console import Console
-from rich.panel import Panel
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from config import settings
+from constants import MODELS
+from events import JsonlSink, RichSink, configure_logging, emit, get_event_bus
 from utils import (
+    attach_file_content,
     calculate_subagent_cost,
     read_file,
     create_folder_structure,
@@ -12,78 +19,245 @@ from utils import (
     sanitize_objective,
     save_exchange_log,
     extract_project_name,
-    extract_folder_structure_and_code
-)
-from orchestrator import Orchestrator
-from subagent import SubAgent
-from refiner import Refiner
-from exceptions import APIError, FileIOError, ConfigurationError
-from dependencies import get_anthropic_client, get_tavily_client
-from anthropic import Anthropic
-from tavily import TavilyClient
-
-# Initialize the Rich Console
-console = Console()
-
-# Configure logging using structlog
-logging.basicConfig(
-    level=settings.LOG_LEVEL,
-    format="%(message)s",
-    handlers=[
-        logging.FileHandler(settings.LOG_FILE),
-        logging.StreamHandler(),
-    ],
+    extract_folder_structure_and_code,
+    run_sync
 )
+from exceptions import APIError, FileIOError, ConfigurationError, PlanError, CacheMissError
+
+# The agents pull in the Anthropic SDK, which takes longer to import than everything else combined.
+# They are imported where they're first needed, so --help and argument errors return at once.
+if TYPE_CHECKING:
+    from tavily import TavilyClient
+    from base_agent import AnthropicClient
+    from orchestrator import Orchestrator
+    from subagent import SubAgent
+    from scheduler import PlannedSubtask
+    from context import ContextManager
+    from cache import ResponseCache
+    from ratelimit import RateLimiter
+    from search import SearchService
+    from journal import RunJournal
+    from router import ModelRouter
+    from reuse import ReuseIndex
+
 logger = logging.getLogger(__name__)
 
-def main(anthropic_client: Anthropic, tavily_client: TavilyClient, objective: str, file_path: str, use_search: bool, model: str, cost_limit: float):
+@dataclass
+class RunResult:
+    objective: str
+    status: str
+    cost: float = 0.0
+    sub_tasks: int = 0
+    refined_output: Optional[str] = None
+    project_name: Optional[str] = None
+    log_file: Optional[str] = None
+    error: Optional[str] = None
+    run_id: Optional[str] = None
+
+def main(anthropic_client: AnthropicClient, tavily_client: Optional[TavilyClient], objective: str, file_path: str, use_search: bool, model: Optional[str], cost_limit: float,
+         **options) -> RunResult:
+    return run_sync(async_main(anthropic_client, tavily_client, objective, file_path, use_search, model, cost_limit, **options))
+
+def role_models(model: Optional[str]) -> Dict[str, str]:
+    # An explicit --model applies to every role; otherwise each role gets its own configured tier.
+    if model:
+        return {"orchestrator": model, "sub_agent": model, "refiner": model}
+    return {"orchestrator": settings.ORCHESTRATOR_MODEL, "sub_agent": settings.SUB_AGENT_MODEL, "refiner": settings.REFINER_MODEL}
+
+def create_router() -> ModelRouter:
+    from router import ModelRouter
+
+    return ModelRouter([tier.strip() for tier in settings.ROUTER_TIERS.split(",") if tier.strip()], settings.ROUTER_HISTORY_PATH,
+                       settings.ROUTER_LARGE_PROMPT_TOKENS, settings.ROUTER_MIN_SAMPLES, settings.ROUTER_MAX_FAILURE_RATE)
+
+def configure_event_output(quiet: bool, events_jsonl: Optional[str]) -> None:
+    sinks = [] if quiet else [RichSink()]
+    if events_jsonl:
+        sinks.append(JsonlSink(events_jsonl))
+    get_event_bus().configure(sinks)
+
+def cost_limit_exceeded(cost_limit: float, total_cost: float) -> bool:
+    if cost_limit > 0.0 and total_cost > cost_limit:
+        logger.warning(f"Cost limit of ${cost_limit:.4f} exceeded. Stopping task processing.")
+        emit("warning", f"Cost limit of [bold]${cost_limit:.4f}[/bold] exceeded. Stopping task processing.", title="Cost Limit Exceeded",
+             style="yellow", cost_limit=cost_limit, cost=total_cost)
+        return True
+    return False
+
+def remember_results(reuse_index: ReuseIndex, sub_agent: SubAgent, task_exchanges: List[Tuple[str, str]]) -> None:
+    # Only results the sub-agent computed in this process have a model and cost; restored and reused ones are skipped.
+    for prompt, result in task_exchanges:
+        outcome = sub_agent.outcomes.get(prompt)
+        if outcome is not None:
+            instruction, context_hash, *usage = outcome
+            reuse_index.add(instruction, result, *usage, context_hash=context_hash)
+
+async def compact_context(context: ContextManager, journal: Optional[RunJournal]) -> None:
+    summarized_count = context.summarized_count
+    await context.compact_async()
+    if journal is not None and context.summarized_count != summarized_count:
+        journal.record_context(context.summary, context.summarized_count)
+
+async def run_iterative(orchestrator: Orchestrator, sub_agent: SubAgent, objective: str, file_content: Optional[str], use_search: bool, cost_limit: float,
+                        task_exchanges: List[Tuple[str, str]], context: ContextManager, journal: Optional[RunJournal] = None) -> None:
+    file_content_for_haiku = None
+    while True:
+        previous_results = context.previous_results()
+        replayed = journal.state.pop_decision() if journal is not None else None
+        if replayed is not None:
+            # The orchestrator already decided this step before the run stopped; don't pay for it again.
+            opus_result, search_query = replayed["response"], replayed["search_query"]
+            file_content_for_haiku = file_content if not task_exchanges else None
+            emit("orchestrator_response", opus_result, title="Orchestrator (from run journal)", style="green", replayed=True)
+        elif not task_exchanges:
+            opus_result, file_content_for_haiku, search_query = await orchestrator.generate_subtask_async(objective, file_content, previous_results, use_search)
+        else:
+            opus_result, _, search_query = await orchestrator.generate_subtask_async(objective, previous_results=previous_results, use_search=use_search)
+        if journal is not None and replayed is None:
+            journal.record_decision(opus_result, search_query)
+
+        if "The task is complete:" in opus_result:
+            final_output = opus_result.replace("The task is complete:", "").strip()
+            break
+        else:
+            sub_task_prompt = opus_result
+            if file_content_for_haiku and not task_exchanges:
+                sub_task_prompt = attach_file_content(sub_task_prompt, file_content_for_haiku)
+            sub_task_result = await sub_agent.process_subtask_async(sub_task_prompt, search_query, context.previous_tasks(), use_search)
+            task_exchanges.append((sub_task_prompt, sub_task_result))
+            if journal is not None:
+                journal.record_result(sub_task_prompt, sub_task_result)
+            context.add(sub_task_prompt, sub_task_result)
+            await compact_context(context, journal)
+            file_content_for_haiku = None
+
+        if cost_limit_exceeded(cost_limit, orchestrator.total_cost + sub_agent.total_cost + context.total_cost):
+            break
+
+async def run_planned(orchestrator: Orchestrator, sub_agent: SubAgent, objective: str, file_content: Optional[str], use_search: bool, cost_limit: float,
+                      task_exchanges: List[Tuple[str, str]], context: ContextManager, max_concurrency: int,
+                      journal: Optional[RunJournal] = None) -> None:
+    from scheduler import DAGScheduler
+
+    scheduler = DAGScheduler(sub_agent, max_concurrency, use_search)
+
+    def over_budget() -> bool:
+        return cost_limit > 0.0 and orchestrator.total_cost + sub_agent.total_cost + context.total_cost > cost_limit
+
+    def on_result(subtask: PlannedSubtask, sub_task_result: str) -> None:
+        # Journal each result as it lands so a crash mid-plan only loses the sub-tasks still running.
+        if journal is not None:
+            journal.record_result(subtask.prompt, sub_task_result, subtask.id)
+
+    replayed = journal.state.pop_plan() if journal is not None else None
+    first_round = replayed.round if replayed is not None else (journal.state.next_plan_round if journal is not None else 0)
+    for plan_round in range(first_round, settings.MAX_PLAN_ROUNDS):
+        completed_results = {}
+        if replayed is not None:
+            opus_result, subtasks, completed_results = replayed.response, replayed.subtasks, replayed.results
+            emit("plan", f"Resuming plan round {plan_round + 1}: {len(completed_results)} of {len(subtasks)} sub-task(s) already done.",
+                 title="Plan (from run journal)", style="green", replayed=True, subtasks=[subtask.id for subtask in subtasks])
+            replayed = None
+        else:
+            previous_results = context.previous_results()
+            plan_file_content = file_content if not task_exchanges else None
+            opus_result, subtasks = await orchestrator.plan_subtasks_async(objective, plan_file_content, previous_results, use_search)
+
+            if plan_file_content:
+                # Only root sub-tasks of the first plan get the file; dependants see it through their dependencies' results.
+                for subtask in subtasks:
+                    if not subtask.depends_on:
+                        subtask.prompt = attach_file_content(subtask.prompt, plan_file_content)
+            if journal is not None:
+                journal.record_plan(plan_round, opus_result, subtasks)
+        if "The task is complete:" in opus_result:
+            break
+
+        for subtask, sub_task_result in await scheduler.run(subtasks, context.previous_tasks(), stop_when=over_budget,
+                                                            completed_results=completed_results, on_result=on_result):
+            task_exchanges.append((subtask.prompt, sub_task_result))
+            context.add(subtask.prompt, sub_task_result)
+        await compact_context(context, journal)
+
+        if cost_limit_exceeded(cost_limit, orchestrator.total_cost + sub_agent.total_cost + context.total_cost):
+            break
+    else:
+        logger.warning(f"Reached the maximum of {settings.MAX_PLAN_ROUNDS} plan rounds. Proceeding to refinement.")
+
+async def async_main(anthropic_client: AnthropicClient, tavily_client: Optional[TavilyClient], objective: str, file_path: str, use_search: bool, model: Optional[str], cost_limit: float,
+                     plan_mode: bool = False, max_concurrency: Optional[int] = None, response_cache: Optional[ResponseCache] = None,
+                     stream: bool = False, rate_limiter: Optional[RateLimiter] = None, search_service: Optional[SearchService] = None,
+                     journal: Optional[RunJournal] = None, large_input: bool = False, router: Optional[ModelRouter] = None,
+                     reuse_index: Optional[ReuseIndex] = None) -> RunResult:
+    from orchestrator import Orchestrator
+    from subagent import SubAgent
+    from refiner import Refiner, ResultMerger
+    from context import ContextManager, ContextSummarizer
+    from search import SearchService
+    from ingest import ChunkAnalyst, digest_file, is_large_file
+    from dependencies import get_tavily_client
+
+    run_id = journal.run_id if journal is not None else None
+    task_exchanges = list(journal.state.exchanges) if journal is not None else []
     file_content = None
+    # Once a sub-task has run, the file only lives on through its results, so a resume doesn't need it.
+    needs_file = bool(file_path) and not task_exchanges
+    digest_input = needs_file and (large_input or is_large_file(file_path, settings.LARGE_INPUT_THRESHOLD_TOKENS))
     if file_path:
         try:
-            file_content = read_file(file_path)
+            if needs_file and not digest_input:
+                file_content = read_file(file_path)
             objective = extract_file_path(objective, file_path)
         except FileIOError as e:
             logger.error(f"File read error: {str(e)}")
-            console.print(Panel(f"File read error: [bold]{str(e)}[/bold]", title="[bold red]Error[/bold red]", title_align="left", border_style="red"))
-            return
+            emit("error", f"File read error: [bold]{str(e)}[/bold]", title="Error", style="red")
+            return RunResult(objective=objective, status="error", error=str(e), run_id=run_id)
 
-    task_exchanges = []
-    haiku_tasks = []
+    if use_search and search_service is None:
+        search_service = SearchService(tavily_client or get_tavily_client(), settings.SEARCH_CACHE_PATH, settings.SEARCH_CACHE_TTL)
+    models = role_models(model)
+    orchestrator = Orchestrator(anthropic_client, models["orchestrator"], response_cache, stream, rate_limiter, search_service)
+    sub_agent = SubAgent(anthropic_client, models["sub_agent"], tavily_client, response_cache, stream, rate_limiter, search_service, router, reuse_index)
+    merger = ResultMerger(anthropic_client, settings.REFINER_MERGE_MODEL, response_cache, rate_limiter)
+    refiner = Refiner(anthropic_client, models["refiner"], response_cache, stream, rate_limiter, merger)
+    summarizer = ContextSummarizer(anthropic_client, settings.CONTEXT_SUMMARY_MODEL, response_cache, rate_limiter)
+    analyst = ChunkAnalyst(anthropic_client, settings.LARGE_INPUT_MODEL, response_cache, rate_limiter)
+    if journal is not None:
+        journal.attach([orchestrator, sub_agent, refiner, summarizer, analyst, merger])
+
+    def run_cost() -> float:
+        return orchestrator.total_cost + sub_agent.total_cost + refiner.total_cost + summarizer.total_cost + analyst.total_cost + merger.total_cost
 
     try:
-        orchestrator = Orchestrator(anthropic_client, model)
-        sub_agent = SubAgent(anthropic_client, model, tavily_client)
-        refiner = Refiner(anthropic_client, model)
-
-        while True:
-            previous_results = [result for _, result in task_exchanges]
-            if not task_exchanges:
-                opus_result, file_content_for_haiku, search_query = orchestrator.generate_subtask(objective, file_content, previous_results, use_search)
-            else:
-                opus_result, _, search_query = orchestrator.generate_subtask(objective, previous_results=previous_results, use_search=use_search)
+        if digest_input:
+            file_content = journal.state.digest if journal is not None else None
+            if file_content is None:
+                file_content = await digest_file(analyst, objective, file_path, settings.LARGE_INPUT_CHUNK_TOKENS, settings.LARGE_INPUT_DIGEST_TOKENS,
+                                                 settings.LARGE_INPUT_CONCURRENCY, settings.LARGE_INPUT_PARTIAL_MAX_TOKENS)
+                if journal is not None:
+                    journal.record_digest(file_content)
 
-            if "The task is complete:" in opus_result:
-                final_output = opus_result.replace("The task is complete:", "").strip()
-                break
+        context = ContextManager(summarizer,
+                                 settings.CONTEXT_TOKEN_BUDGET, settings.CONTEXT_MIN_RECENT, settings.CONTEXT_SUMMARY_MAX_TOKENS)
+        if journal is not None:
+            context.restore(journal.state.summary, journal.state.summarized_count, task_exchanges)
+
+        refined_output = journal.state.refined_output if journal is not None else None
+        if refined_output is None:
+            if plan_mode:
+                await run_planned(orchestrator, sub_agent, objective, file_content, use_search, cost_limit, task_exchanges, context,
+                                  max_concurrency or settings.MAX_CONCURRENT_SUBTASKS, journal)
             else:
-                sub_task_prompt = opus_result
-                if file_content_for_haiku and not haiku_tasks:
-                    sub_task_prompt = f"{sub_task_prompt}\n\nFile content:\n{file_content_for_haiku}"
-                sub_task_result = sub_agent.process_subtask(sub_task_prompt, search_query, haiku_tasks, use_search)
-                haiku_tasks.append({"task": sub_task_prompt, "result": sub_task_result})
-                task_exchanges.append((sub_task_prompt, sub_task_result))
-                file_content_for_haiku = None
-
-            total_cost = orchestrator.total_cost + sub_agent.total_cost
-            if cost_limit > 0.0 and total_cost > cost_limit:
-                logger.warning(f"Cost limit of ${cost_limit:.4f} exceeded. Stopping task processing.")
-                console.print(Panel(f"Cost limit of [bold]${cost_limit:.4f}[/bold] exceeded. Stopping task processing.",
-                                    title="[bold yellow]Cost Limit Exceeded[/bold yellow]", title_align="left", border_style="yellow"))
-                break
+                await run_iterative(orchestrator, sub_agent, objective, file_content, use_search, cost_limit, task_exchanges, context, journal)
+        if reuse_index is not None:
+            remember_results(reuse_index, sub_agent, task_exchanges)
 
         sanitized_objective = sanitize_objective(objective)
         timestamp = datetime.now().strftime(settings.TIMESTAMP_FORMAT)
-        refined_output = refiner.refine_output(objective, [result for _, result in task_exchanges], timestamp, sanitized_objective)
+        if refined_output is None:
+            refined_output = await refiner.refine_output_async(objective, [result for _, result in task_exchanges], timestamp, sanitized_objective)
+            if journal is not None:
+                journal.record_refined(refined_output)
 
         project_name = extract_project_name(refined_output) or sanitized_objective
         folder_structure, code_blocks = extract_folder_structure_and_code(refined_output)
@@ -92,27 +266,134 @@ def main(anthropic_client: Anthropic, tavily_client: TavilyClient, objective: st
         truncated_objective = sanitized_objective[:settings.MAX_OBJECTIVE_LENGTH]
         filename = f"{timestamp}_{truncated_objective}.md"
         save_exchange_log(filename, objective, task_exchanges, refined_output)
+        if journal is not None:
+            journal.record_complete()
 
-        console.print(f"\n[bold]Refined Final output:[/bold]\n{refined_output}")
-        console.print(f"\nFull exchange log saved to {filename}")
-        console.print(f"\nTotal Cost: ${orchestrator.total_cost + sub_agent.total_cost + refiner.total_cost:.4f}")
+        emit("run_complete", f"\n[bold]Refined Final output:[/bold]\n{refined_output}\n\nFull exchange log saved to {filename}\n\nTotal Cost: ${run_cost():.4f}",
+             run_id=run_id, project=project_name, log_file=filename, cost=run_cost(), sub_tasks=len(task_exchanges))
+        if response_cache is not None:
+            cache_stats = response_cache.stats()
+            emit("cache_stats", f"Response Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%} hit rate), {cache_stats['entries']} entries", **cache_stats)
+        if search_service is not None:
+            search_stats = search_service.stats()
+            emit("search_stats", f"Search Cache: {search_stats['hits']} hits, {search_stats['coalesced']} coalesced, {search_stats['misses']} searches issued",
+                 **search_stats)
+        if reuse_index is not None:
+            reuse_stats = reuse_index.stats()
+            emit("reuse_stats", f"Result Reuse: {reuse_stats['direct_hits']} reused, {reuse_stats['context_hits']} offered as context, "
+                 f"{reuse_stats['lookups']} lookups ({reuse_stats['hit_rate']:.0%} hit rate), saved "
+                 f"{reuse_stats['saved_input_tokens'] + reuse_stats['saved_output_tokens']} tokens (${reuse_stats['saved_cost']:.4f}), "
+                 f"{reuse_stats['entries']} entries", **reuse_stats)
+        return RunResult(objective=objective, status="completed", cost=run_cost(), sub_tasks=len(task_exchanges),
+                         refined_output=refined_output, project_name=project_name, log_file=filename, run_id=run_id)
 
-    except (APIError, ConfigurationError) as e:
+    except CacheMissError as e:
+        logger.error(f"Replay failed: {str(e)}")
+        emit("error", f"Replay failed: [bold]{str(e)}[/bold]", title="Cache Miss", style="red")
+        return RunResult(objective=objective, status="error", cost=run_cost(), sub_tasks=len(task_exchanges), error=str(e), run_id=run_id)
+    except (APIError, ConfigurationError, PlanError, FileIOError) as e:
         logger.error(f"Error in processing task: {str(e)}")
-        console.print(Panel(f"Error in processing task: [bold]{str(e)}[/bold]", title="[bold red]Error[/bold red]", title_align="left", border_style="red"))
+        emit("error", f"Error in processing task: [bold]{str(e)}[/bold]", title="Error", style="red")
+        return RunResult(objective=objective, status="error", cost=run_cost(), sub_tasks=len(task_exchanges), error=str(e), run_id=run_id)
+    finally:
+        if router is not None:
+            # The router only marks outcomes in memory; they are written once per run, off the event loop.
+            await asyncio.to_thread(router.save)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="AI-Assisted Task Completion")
-    parser.add_argument("objective", help="The objective or goal to achieve")
+    parser.add_argument("objective", nargs="?", help="The objective or goal to achieve")
     parser.add_argument("--file", help="Path to the input file (optional)")
     parser.add_argument("--search", action="store_true", help="Enable search functionality")
-    parser.add_argument("--model", choices=["claude-3-opus-20240229", "claude-3-haiku-20240307", "claude-3-sonnet-20240229"],
-                        default="claude-3-opus-20240229", help="Choose the AI model for processing")
+    parser.add_argument("--model", choices=MODELS,
+                        help="Use this model for the orchestrator, sub-agents and refiner instead of ORCHESTRATOR_MODEL, SUB_AGENT_MODEL and REFINER_MODEL")
     parser.add_argument("--cost-limit", type=float, default=0.0,
                         help="Set a cost limit for the task (0.0 for no limit)")
+    parser.add_argument("--plan", action="store_true",
+                        help="Plan all remaining sub-tasks up front and run independent ones in parallel")
+    parser.add_argument("--max-concurrency", type=int,
+                        help="Maximum number of sub-tasks to run concurrently in --plan mode (default: MAX_CONCURRENT_SUBTASKS)")
+    parser.add_argument("--cache", action="store_true", help="Reuse cached model responses for identical requests")
+    parser.add_argument("--replay", action="store_true",
+                        help="Answer every model call from the response cache and fail on a cache miss")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream model responses to the console as they are generated")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Send a duplicate of any non-streamed call still running past the p95 latency of its role and model")
+    parser.add_argument("--metrics-jsonl", help="Append one telemetry span per model/search call to this JSONL file")
+    parser.add_argument("--metrics-prom", help="Write aggregated call metrics to this Prometheus textfile")
+    parser.add_argument("--large-input", action="store_true",
+                        help="Digest --file in parallel chunks before orchestration, even if it is below LARGE_INPUT_THRESHOLD_TOKENS")
+    parser.add_argument("--route", action="store_true",
+                        help="Route each sub-task to the cheapest model tier likely to handle it, escalating when its output fails validation")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                        help="Continue an interrupted run from its journal; objective and run options are taken from the journal")
+    parser.add_argument("--reuse", action="store_true",
+                        help="Reuse results of similar sub-tasks from earlier runs, directly or as context for the sub-agent")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Run headless: no terminal output and no log records on stderr (the log file is still written)")
+    parser.add_argument("--events-jsonl", help="Append one JSON object per progress event to this file")
     args = parser.parse_args()
+    if not args.objective and not args.resume:
+        parser.error("an objective is required unless --resume is given")
+
+    from telemetry import get_telemetry
+    from resilience import enable_hedging, print_resilience_summary
+    from journal import RunJournal
+    from cache import ResponseCache
+    from reuse import ReuseIndex
+    from dependencies import get_async_anthropic_client
+
+    # Log records are written by a background thread so agents never block on file or terminal I/O.
+    configure_logging(settings.LOG_LEVEL, settings.LOG_FILE, to_console=not args.quiet)
+    configure_event_output(args.quiet, args.events_jsonl)
+    if args.hedge:
+        enable_hedging()
+
+    if args.resume:
+        try:
+            journal = RunJournal.open(settings.JOURNAL_DIR, args.resume)
+        except FileIOError as e:
+            parser.error(str(e))
+        params = journal.state.params
+        emit("resume", f"Resuming run [bold]{journal.run_id}[/bold] with {len(journal.state.exchanges)} completed sub-task(s)",
+             title="Resume", style="blue", run_id=journal.run_id)
+    else:
+        params = {"objective": args.objective, "file_path": args.file, "use_search": args.search, "model": args.model,
+                  "cost_limit": args.cost_limit, "plan_mode": args.plan, "max_concurrency": args.max_concurrency,
+                  "large_input": args.large_input, "route": args.route}
+        journal = RunJournal.create(settings.JOURNAL_DIR, params)
+        emit("run_started", f"Run ID: [bold]{journal.run_id}[/bold] (continue an interrupted run with --resume {journal.run_id})", run_id=journal.run_id)
 
-    anthropic_client = get_anthropic_client()
-    tavily_client = get_tavily_client()
+    anthropic_client = get_async_anthropic_client()
+    # The Tavily client is only built if the run searches; async_main creates it on demand.
+    response_cache = None
+    if args.cache or args.replay:
+        response_cache = ResponseCache(settings.RESPONSE_CACHE_PATH, settings.RESPONSE_CACHE_MAX_ENTRIES,
+                                       settings.RESPONSE_CACHE_MAX_BYTES, replay=args.replay)
+
+    router = create_router() if params.get("route", False) else None
+    reuse_index = ReuseIndex(settings.REUSE_INDEX_PATH, settings.REUSE_MAX_ENTRIES) if args.reuse else None
+    try:
+        result = asyncio.run(async_main(anthropic_client, None, params["objective"], params["file_path"], params["use_search"],
+                                        params["model"], params["cost_limit"], plan_mode=params["plan_mode"],
+                                        max_concurrency=params["max_concurrency"], response_cache=response_cache, stream=args.stream,
+                                        journal=journal, large_input=params.get("large_input", False), router=router,
+                                        reuse_index=reuse_index))
+    except KeyboardInterrupt:
+        emit("interrupted", f"\nInterrupted. Continue with: python main.py --resume {journal.run_id}", run_id=journal.run_id)
+        sys.exit(130)
+    finally:
+        journal.close()
+    if result.status != "completed":
+        emit("status", f"Continue with: python main.py --resume {journal.run_id}", run_id=journal.run_id)
 
-    main(anthropic_client, tavily_client, args.objective, args.file, args.search, args.model, args.cost_limit)
\ No newline at end of file
+    telemetry = get_telemetry()
+    telemetry.print_summary()
+    print_resilience_summary()
+    if router is not None:
+        router.print_summary()
+    if args.metrics_jsonl:
+        telemetry.export_jsonl(args.metrics_jsonl)
+    if args.metrics_prom:
+        telemetry.export_prometheus(args.metrics_prom)
\ No newline at end of file
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import stat
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from events import emit
+
+MANIFEST_NAME = ".agentic-manifest.json"
+# Below this many files to write, a thread pool costs more than it saves.
+PARALLEL_WRITE_THRESHOLD = 16
+# Per-category file names listed in the summary before it just gives a count.
+MAX_LISTED = 10
+# Read once: os.umask can only be queried by setting it, which would race with writer threads.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+@dataclass
+class MaterializeReport:
+    project: str
+    folders: int = 0
+    written: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def atomic_write(path: str, data: bytes, mode: Optional[int] = None) -> None:
+    """Write ``data`` to ``path`` atomically, keeping the existing file's mode unless ``mode`` is given."""
+    # Write beside the target and rename over it, so a crash or a concurrent reader never sees a half-written file.
+    directory = os.path.dirname(os.path.abspath(path))
+    if mode is None:
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            # NamedTemporaryFile creates files as 0600; give new files the mode open() would.
+            mode = 0o666 & ~_UMASK
+    file = tempfile.NamedTemporaryFile('wb', dir=directory, prefix=".tmp-", delete=False)
+    try:
+        with file:
+            file.write(data)
+            file.flush()
+            os.fchmod(file.fileno(), mode)
+            os.fsync(file.fileno())
+        os.replace(file.name, path)
+    except BaseException:
+        os.unlink(file.name)
+        raise
+
+def load_manifest(project_dir: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(project_dir, MANIFEST_NAME), 'r') as file:
+            manifest = json.load(file)
+        return manifest if isinstance(manifest, dict) else {}
+    except (IOError, ValueError):
+        return {}
+
+def _plan(project_dir: str, structure: Dict[str, Any]) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Flatten the nested folder structure into folder paths and (relative path, filename) pairs."""
+    folders: List[str] = []
+    files: List[Tuple[str, str]] = []
+    pending = [("", structure)]
+    while pending:
+        prefix, node = pending.pop()
+        for key, value in node.items():
+            relative = os.path.join(prefix, key) if prefix else key
+            if isinstance(value, dict):
+                folders.append(relative)
+                pending.append((relative, value))
+            else:
+                files.append((relative, key))
+    return folders, files
+
+def _inside(project_dir: str, relative: str) -> bool:
+    root = os.path.abspath(project_dir)
+    return os.path.commonpath([root, os.path.abspath(os.path.join(root, relative))]) == root
+
+def materialize_project(project_dir: str, folder_structure: Dict[str, Any], code_blocks: List[Tuple[str, str]],
+                        max_workers: int = 8) -> MaterializeReport:
+    """Write the refined project to disk, touching only files whose content changed since the last run.
+
+    Each file's SHA-256 is kept in a manifest inside the project folder; a file whose
+    hash matches and that is still on disk with the same size is skipped.
+    """
+    report = MaterializeReport(project_dir)
+    os.makedirs(project_dir, exist_ok=True)
+    # The first block for a filename wins, as it always has.
+    code_by_name: Dict[str, str] = {}
+    for filename, code in code_blocks:
+        code_by_name.setdefault(filename, code)
+
+    folders, files = _plan(project_dir, folder_structure)
+    for relative in folders:
+        if not _inside(project_dir, relative):
+            report.failed.append((relative, "outside the project folder"))
+            continue
+        try:
+            os.makedirs(os.path.join(project_dir, relative), exist_ok=True)
+            report.folders += 1
+        except OSError as e:
+            report.failed.append((relative, str(e)))
+
+    manifest = load_manifest(project_dir)
+    new_manifest: Dict[str, str] = {}
+    to_write: List[Tuple[str, bytes]] = []
+    for relative, filename in files:
+        code = code_by_name.get(filename)
+        if not code:
+            report.missing.append(relative)
+            continue
+        if not _inside(project_dir, relative):
+            report.failed.append((relative, "outside the project folder"))
+            continue
+        data = code.encode("utf-8")
+        digest = content_hash(data)
+        path = os.path.join(project_dir, relative)
+        if manifest.get(relative) == digest and os.path.isfile(path) and os.path.getsize(path) == len(data):
+            report.unchanged.append(relative)
+            new_manifest[relative] = digest
+            continue
+        to_write.append((relative, data))
+        new_manifest[relative] = digest
+
+    def write(item: Tuple[str, bytes]) -> Optional[str]:
+        relative, data = item
+        try:
+            atomic_write(os.path.join(project_dir, relative), data)
+            return None
+        except OSError as e:
+            return str(e)
+
+    if len(to_write) >= PARALLEL_WRITE_THRESHOLD and max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            errors = list(executor.map(write, to_write))
+    else:
+        errors = [write(item) for item in to_write]
+    for (relative, _), error in zip(to_write, errors):
+        if error is None:
+            report.written.append(relative)
+        else:
+            report.failed.append((relative, error))
+            new_manifest.pop(relative, None)
+
+    try:
+        atomic_write(os.path.join(project_dir, MANIFEST_NAME), json.dumps(new_manifest, indent=1, sort_keys=True).encode("utf-8"))
+    except OSError as e:
+        report.failed.append((MANIFEST_NAME, str(e)))
+    return report
+
+def _listing(label: str, paths: List[str]) -> str:
+    shown = ", ".join(paths[:MAX_LISTED])
+    more = f" and {len(paths) - MAX_LISTED} more" if len(paths) > MAX_LISTED else ""
+    return f"\n{label}: {shown}{more}"
+
+def print_report(report: MaterializeReport) -> None:
+    text = (f"Project folder: [bold]{report.project}[/bold]\n"
+            f"{len(report.written)} file(s) written, {len(report.unchanged)} unchanged, {report.folders} folder(s)")
+    if report.missing:
+        text += _listing("[bold yellow]Missing code content[/bold yellow]", report.missing)
+    if report.failed:
+        text += _listing("[bold red]Failed[/bold red]", [f"{path} ({error})" for path, error in report.failed])
+    style = "red" if report.failed else "yellow" if report.missing else "green"
+    emit("project_files", text, title="Project Files", style=style, project=report.project, written=len(report.written),
+         unchanged=len(report.unchanged), missing=report.missing, failed=[path for path, _ in report.failed])
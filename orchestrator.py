@@ -1,30 +1,32 @@
-from anthropic import Anthropic
-from config import settings
-from utils import calculate_subagent_cost
-from rich.console import Console
-from rich.panel import Panel
+from base_agent import BaseAgent, AnthropicClient
+from utils import run_sync, preview_text
+from events import emit
 import re
 import json
-from tenacity import retry, stop_after_attempt, wait_exponential
-from exceptions import APIError
-from typing import Dict, Any, List, Tuple, Optional
+from cache import ResponseCache
+from ratelimit import RateLimiter
+from search import SearchService
+from streaming import TextCallback
+from exceptions import APIError, CacheMissError, PlanError
+from scheduler import PlannedSubtask, validate_plan
+from typing import List, Tuple, Optional
 
-console = Console()
+class Orchestrator(BaseAgent):
+    role = "orchestrator"
 
-class Orchestrator:
-    def __init__(self, anthropic_client: Anthropic, model: str):
-        self.anthropic_client = anthropic_client
-        self.model = model
-        self.total_cost = 0.0
+    def __init__(self, anthropic_client: AnthropicClient, model: str, response_cache: Optional[ResponseCache] = None, stream: bool = False,
+                 rate_limiter: Optional[RateLimiter] = None, search_service: Optional[SearchService] = None):
+        super().__init__(anthropic_client, model, response_cache, stream, rate_limiter)
+        self.search_service = search_service
 
-    @retry(stop=stop_after_attempt(settings.RETRY_ATTEMPTS), wait=wait_exponential(multiplier=1, min=5, max=60))
-    def generate_subtask(self, objective: str, file_content: Optional[str] = None, previous_results: Optional[List[str]] = None, use_search: bool = False) -> Tuple[str, Optional[str], Optional[str]]:
-        console.print(f"\n[bold]Calling Orchestrator for your objective[/bold]")
+    def generate_subtask(self, objective: str, file_content: Optional[str] = None, previous_results: Optional[List[str]] = None, use_search: bool = False, on_text: Optional[TextCallback] = None) -> Tuple[str, Optional[str], Optional[str]]:
+        return run_sync(self.generate_subtask_async(objective, file_content, previous_results, use_search, on_text=on_text))
+
+    async def generate_subtask_async(self, objective: str, file_content: Optional[str] = None, previous_results: Optional[List[str]] = None, use_search: bool = False, on_text: Optional[TextCallback] = None) -> Tuple[str, Optional[str], Optional[str]]:
+        emit("agent_call", "\n[bold]Calling Orchestrator for your objective[/bold]", role=self.role)
         previous_results_text = "\n".join(previous_results) if previous_results else "None"
         if file_content:
-            console.print(
-                Panel(f"File content:\n{file_content}", title="[bold blue]File Content[/bold blue]", title_align="left",
-                      border_style="blue"))
+            emit("file_content", f"File content:\n{preview_text(file_content)}", title="File Content", style="blue")
 
         messages = [
             {
@@ -41,24 +43,21 @@ class Orchestrator:
                                            "text": "Please also generate a JSON object containing a single 'search_query' key, which represents a question that, when asked online, would yield important information for solving the subtask. The question should be specific and targeted to elicit the most relevant and helpful resources. Format your JSON like this, with no additional text before or after:\n{\"search_query\": \"<question>\"}\n"})
 
         try:
-            opus_response = self.anthropic_client.messages.create(
+            completion = await self._complete(
+                on_text=on_text,
                 model=self.model,
                 max_tokens=4096,
                 messages=messages
             )
+        except CacheMissError:
+            raise
         except Exception as e:
-            console.print(Panel(f"Error in calling Orchestrator: [bold]{str(e)}[/bold]",
-                                title="[bold red]Orchestrator Error[/bold red]", title_align="left",
-                                border_style="red"))
+            emit("error", f"Error in calling Orchestrator: [bold]{str(e)}[/bold]", title="Orchestrator Error", style="red", role=self.role)
             raise APIError(f"Error in calling Anthropic API: {str(e)}") from e
 
-        response_text = opus_response.content[0].text
-        console.print(
-            f"Input Tokens: {opus_response.usage.input_tokens}, Output Tokens: {opus_response.usage.output_tokens}")
-        total_cost = calculate_subagent_cost(self.model, opus_response.usage.input_tokens,
-                                             opus_response.usage.output_tokens)
-        self.total_cost += total_cost
-        console.print(f"Orchestrator Cost: ${total_cost:.4f}")
+        response_text = completion.text
+        total_cost = self._track_completion_cost(completion)
+        self._emit_usage("Orchestrator Cost", completion.input_tokens, completion.output_tokens, total_cost)
 
         search_query = None
         if use_search:
@@ -67,16 +66,87 @@ class Orchestrator:
                 json_string = json_match.group()
                 try:
                     search_query = json.loads(json_string)["search_query"]
-                    console.print(Panel(f"Search Query: {search_query}", title="[bold blue]Search Query[/bold blue]",
-                                        title_align="left", border_style="blue"))
+                    if self.search_service is not None:
+                        # Start the search now so it overlaps with whatever runs before the sub-agent needs it.
+                        self.search_service.prefetch(search_query)
+                    emit("search_query", f"Search Query: {search_query}", title="Search Query", style="blue", query=search_query)
                     response_text = response_text.replace(json_string, "").strip()
                 except json.JSONDecodeError as e:
-                    console.print(Panel(f"Error parsing JSON: {e}", title="[bold red]JSON Parsing Error[/bold red]",
-                                        title_align="left", border_style="red"))
-                    console.print(Panel(f"Skipping search query extraction.",
-                                        title="[bold yellow]Search Query Extraction Skipped[/bold yellow]",
-                                        title_align="left", border_style="yellow"))
-
-        console.print(Panel(response_text, title=f"[bold green]Opus Orchestrator[/bold green]", title_align="left",
-                            border_style="green", subtitle="Sending task to Haiku 👇"))
-        return response_text, file_content, search_query
\ No newline at end of file
+                    emit("error", f"Error parsing JSON: {e}", title="JSON Parsing Error", style="red")
+                    emit("warning", "Skipping search query extraction.", title="Search Query Extraction Skipped", style="yellow")
+
+        if not self.stream:
+            emit("orchestrator_response", response_text, title="Opus Orchestrator", style="green", subtitle="Sending task to Haiku 👇")
+        return response_text, file_content, search_query
+
+    def plan_subtasks(self, objective: str, file_content: Optional[str] = None, previous_results: Optional[List[str]] = None, use_search: bool = False, on_text: Optional[TextCallback] = None) -> Tuple[str, List[PlannedSubtask]]:
+        return run_sync(self.plan_subtasks_async(objective, file_content, previous_results, use_search, on_text=on_text))
+
+    async def plan_subtasks_async(self, objective: str, file_content: Optional[str] = None, previous_results: Optional[List[str]] = None, use_search: bool = False, on_text: Optional[TextCallback] = None) -> Tuple[str, List[PlannedSubtask]]:
+        emit("agent_call", "\n[bold]Calling Orchestrator to plan your objective[/bold]", role=self.role)
+        previous_results_text = "\n".join(previous_results) if previous_results else "None"
+        search_field = ', "search_query": "<question to ask online for this sub-task>"' if use_search else ""
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text",
+                     "text": f"Based on the following objective{' and file content' if file_content else ''}, and the previous sub-task results (if any), please assess if the objective has been fully achieved. If the previous sub-task results comprehensively address all aspects of the objective, include the phrase 'The task is complete:' at the beginning of your response. Otherwise, plan ALL of the remaining sub-tasks needed to achieve the objective. Each sub-task needs a concise and detailed prompt for a subagent so it can execute that task on its own. IMPORTANT!!! when dealing with code tasks make sure the plan includes checking the code for errors and providing fixes. Sub-tasks run in parallel unless they declare a dependency, so only list a dependency when a sub-task truly needs another sub-task's result. Provide the plan as a valid JSON object wrapped in <plan> tags, with no other JSON in your response, formatted like this:\n<plan>{{\"subtasks\": [{{\"id\": \"1\", \"prompt\": \"<prompt for the subagent>\", \"depends_on\": []{search_field}}}]}}</plan>\n\nObjective: {objective}" + (
+                         '\nFile content:\n' + file_content if file_content else '') + f"\n\nPrevious sub-task results:\n{previous_results_text}"}
+                ]
+            }
+        ]
+
+        try:
+            completion = await self._complete(
+                on_text=on_text,
+                model=self.model,
+                max_tokens=4096,
+                messages=messages
+            )
+        except CacheMissError:
+            raise
+        except Exception as e:
+            emit("error", f"Error in calling Orchestrator: [bold]{str(e)}[/bold]", title="Orchestrator Error", style="red", role=self.role)
+            raise APIError(f"Error in calling Anthropic API: {str(e)}") from e
+
+        response_text = completion.text
+        total_cost = self._track_completion_cost(completion)
+        self._emit_usage("Orchestrator Cost", completion.input_tokens, completion.output_tokens, total_cost)
+
+        if "The task is complete:" in response_text:
+            if not self.stream:
+                emit("orchestrator_response", response_text, title="Opus Orchestrator", style="green")
+            return response_text, []
+
+        subtasks = self._parse_plan(response_text, use_search)
+        if self.search_service is not None:
+            for subtask in subtasks:
+                if subtask.search_query:
+                    self.search_service.prefetch(subtask.search_query)
+        emit("plan", "\n".join(f"[bold]{subtask.id}[/bold] (after: {', '.join(subtask.depends_on) or '-'}) {subtask.prompt}" for subtask in subtasks),
+             title="Opus Orchestrator Plan", style="green", subtitle=f"Dispatching {len(subtasks)} sub-tasks to Haiku 👇",
+             subtasks=[subtask.id for subtask in subtasks])
+        return response_text, subtasks
+
+    @staticmethod
+    def _parse_plan(response_text: str, use_search: bool) -> List[PlannedSubtask]:
+        plan_match = re.search(r'<plan>(.*?)</plan>', response_text, re.DOTALL) or re.search(r'{.*}', response_text, re.DOTALL)
+        if not plan_match:
+            raise PlanError("Orchestrator response did not contain a plan")
+        try:
+            raw_plan = json.loads(plan_match.group(1) if plan_match.groups() else plan_match.group())
+            subtasks = [
+                PlannedSubtask(
+                    id=str(item["id"]),
+                    prompt=item["prompt"],
+                    depends_on=[str(dep) for dep in item.get("depends_on") or []],
+                    search_query=item.get("search_query") if use_search else None,
+                )
+                for item in raw_plan["subtasks"]
+            ]
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            raise PlanError(f"Error parsing orchestrator plan: {e}") from e
+        if not subtasks:
+            raise PlanError("Orchestrator returned an empty plan")
+        return validate_plan(subtasks)
@@ -1,60 +1,146 @@
-from anthropic import Anthropic
 from config import settings
-from utils import calculate_subagent_cost
-from rich.console import Console
-from rich.panel import Panel
-from tenacity import retry, stop_after_attempt, wait_exponential
-from exceptions import APIError
-from typing import Dict, Any, List, Tuple, Optional
-
-console = Console()
-
-class Refiner:
-    def __init__(self, anthropic_client: Anthropic, model: str):
-        self.anthropic_client = anthropic_client
-        self.model = model
-        self.total_cost = 0.0
-
-    @retry(stop=stop_after_attempt(settings.RETRY_ATTEMPTS), wait=wait_exponential(multiplier=1, min=4, max=60))
-    def refine_output(self, objective: str, sub_task_results: List[str], filename: str, projectname: str, continuation: bool = False) -> str:
-        console.print("\nCalling Opus to provide the refined final output for your objective:")
+from base_agent import BaseAgent, AnthropicClient
+from utils import run_sync
+from events import emit
+import asyncio
+import re
+from cache import ResponseCache
+from ratelimit import RateLimiter
+from streaming import TextCallback
+from exceptions import APIError, CacheMissError
+from tokens import estimate_tokens, group_by_budget
+from typing import List, Optional
+
+REFINE_INSTRUCTIONS = "\n\nPlease review and refine the sub-task results into a cohesive final output. Add any missing information or details as needed. When working on code projects, ONLY AND ONLY IF THE PROJECT IS CLEARLY A CODING ONE please provide the following:\n1. Project Name: Create a concise and appropriate project name that fits the project based on what it's creating. The project name should be no more than 20 characters long.\n2. Folder Structure: Provide the folder structure as a valid JSON object, where each key represents a folder or file, and nested keys represent subfolders. Use null values for files. Ensure the JSON is properly formatted without any syntax errors. Please make sure all keys are enclosed in double quotes, and ensure objects are correctly encapsulated with braces, separating items with commas as necessary.\nWrap the JSON object in <folder_structure> tags.\n3. Code Files: For each code file, include ONLY the file name NEVER EVER USE THE FILE PATH OR ANY OTHER FORMATTING YOU ONLY USE THE FOLLOWING format 'Filename: <filename>' followed by the code block enclosed in triple backticks, with the language identifier after the opening backticks, like this:\n\n​python\n<code>\n​"
+
+# A fenced code block, optionally preceded by the "Filename:" line that extract_folder_structure_and_code keys on.
+CODE_BLOCK_PATTERN = re.compile(r"(?:Filename: (\S+)[ \t]*\n\s*)?(```[^\n]*\n.*?\n```)", re.DOTALL)
+PLACEHOLDER_PATTERN = re.compile(r"\[\[CODE_BLOCK (\d+)[^\]]*\]\]")
+PLACEHOLDER_INSTRUCTIONS = ("Code blocks have been replaced by placeholders such as [[CODE_BLOCK 3: app.py, 40 lines]], and the original code is "
+                            "restored into your answer afterwards. Copy every placeholder you keep exactly as written, on its own line after "
+                            "its 'Filename:' line, instead of writing the code out. Where several placeholders are versions of the same file, "
+                            "keep only the highest-numbered one. Only write a code block yourself for a file or fix that no placeholder covers.")
+
+def protect_code_blocks(text: str, code_blocks: List[str]) -> str:
+    """Swap each fenced code block in ``text`` for a numbered placeholder, appending the originals to ``code_blocks``."""
+    def replace(match: re.Match) -> str:
+        filename, block = match.group(1), match.group(2)
+        code_blocks.append(block)
+        placeholder = f"[[CODE_BLOCK {len(code_blocks)}: {filename or 'unnamed'}, {block.count(chr(10)) - 1} lines]]"
+        return f"Filename: {filename}\n{placeholder}" if filename else placeholder
+
+    return CODE_BLOCK_PATTERN.sub(replace, text)
+
+def restore_code_blocks(text: str, code_blocks: List[str]) -> str:
+    def replace(match: re.Match) -> str:
+        index = int(match.group(1))
+        return code_blocks[index - 1] if 0 < index <= len(code_blocks) else match.group(0)
+
+    return PLACEHOLDER_PATTERN.sub(replace, text)
+
+class ResultMerger(BaseAgent):
+    role = "result_merger"
+
+    def __init__(self, anthropic_client: AnthropicClient, model: str, response_cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
+        super().__init__(anthropic_client, model, response_cache, rate_limiter=rate_limiter)
+
+    async def merge_async(self, objective: str, results: List[str], max_tokens: int) -> str:
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text",
+                     "text": "Below are the results of consecutive sub-tasks working toward the objective that follows. Merge them into one "
+                             "consolidated result for the editor who writes the final output. Keep every decision, fact, file name, interface, "
+                             "fix and open issue, keep the order in which the work happened, and drop repetition. "
+                             f"{PLACEHOLDER_INSTRUCTIONS} Reply with the merged result only.\n\n"
+                             f"Objective: {objective}\n\nResults:\n" + "\n\n".join(results)}
+                ]
+            }
+        ]
+
+        try:
+            completion = await self._complete(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=messages
+            )
+        except CacheMissError:
+            raise
+        except Exception as e:
+            emit("error", f"Error in calling Result Merger: [bold]{str(e)}[/bold]", title="Result Merger Error", style="red", role=self.role)
+            raise APIError(f"Error in calling Anthropic API: {str(e)}") from e
+
+        self._track_completion_cost(completion)
+        return completion.text.strip()
+
+    async def reduce_async(self, objective: str, results: List[str], target_tokens: int, group_tokens: int, concurrency: int,
+                           max_tokens: int) -> List[str]:
+        """Merge ``results`` level by level, each level's groups concurrently, until they fit ``target_tokens``."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def merge(group: List[str]) -> str:
+            if len(group) == 1:
+                return group[0]
+            async with semaphore:
+                return await self.merge_async(objective, group, max_tokens)
+
+        count, levels = len(results), 0
+        while len(results) > 1 and sum(estimate_tokens(result) for result in results) > target_tokens:
+            results = list(await asyncio.gather(*(merge(group) for group in group_by_budget(results, group_tokens))))
+            levels += 1
+        emit("cost", f"Merged {count} sub-task results into {len(results)} in {levels} level(s). Merge Cost: ${self.total_cost:.4f}",
+             role=self.role, cost=self.total_cost, merged=count, remaining=len(results), levels=levels)
+        return results
+
+class Refiner(BaseAgent):
+    role = "refiner"
+
+    def __init__(self, anthropic_client: AnthropicClient, model: str, response_cache: Optional[ResponseCache] = None, stream: bool = False,
+                 rate_limiter: Optional[RateLimiter] = None, merger: Optional[ResultMerger] = None):
+        super().__init__(anthropic_client, model, response_cache, stream, rate_limiter)
+        self.merger = merger
+
+    def refine_output(self, objective: str, sub_task_results: List[str], filename: str, projectname: str, on_text: Optional[TextCallback] = None) -> str:
+        return run_sync(self.refine_output_async(objective, sub_task_results, filename, projectname, on_text=on_text))
+
+    async def refine_output_async(self, objective: str, sub_task_results: List[str], filename: str, projectname: str, on_text: Optional[TextCallback] = None) -> str:
+        emit("agent_call", "\nCalling Opus to provide the refined final output for your objective:", role=self.role)
+        code_blocks: List[str] = []
+        results_text = "\n".join(sub_task_results)
+        if self.merger is not None and estimate_tokens(results_text) > settings.REFINER_TREE_THRESHOLD_TOKENS:
+            # Too much for one pass: merge groups of results with the cheaper model first, carrying code through as placeholders.
+            summaries = [protect_code_blocks(result, code_blocks) for result in sub_task_results]
+            summaries = await self.merger.reduce_async(objective, summaries, settings.REFINER_TREE_THRESHOLD_TOKENS, settings.REFINER_GROUP_TOKENS,
+                                                       settings.REFINER_MERGE_CONCURRENCY, settings.REFINER_MERGE_MAX_TOKENS)
+            results_text = "\n".join(summaries) + f"\n\n{PLACEHOLDER_INSTRUCTIONS}"
         messages = [
             {
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": "Objective: " + objective + "\n\nSub-task results:\n" + "\n".join(
-                        sub_task_results) + "\n\nPlease review and refine the sub-task results into a cohesive final output. Add any missing information or details as needed. When working on code projects, ONLY AND ONLY IF THE PROJECT IS CLEARLY A CODING ONE please provide the following:\n1. Project Name: Create a concise and appropriate project name that fits the project based on what it's creating. The project name should be no more than 20 characters long.\n2. Folder Structure: Provide the folder structure as a valid JSON object, where each key represents a folder or file, and nested keys represent subfolders. Use null values for files. Ensure the JSON is properly formatted without any syntax errors. Please make sure all keys are enclosed in double quotes, and ensure objects are correctly encapsulated with braces, separating items with commas as necessary.\nWrap the JSON object in <folder_structure> tags.\n3. Code Files: For each code file, include ONLY the file name NEVER EVER USE THE FILE PATH OR ANY OTHER FORMATTING YOU ONLY USE THE FOLLOWING format 'Filename: <filename>' followed by the code block enclosed in triple backticks, with the language identifier after the opening backticks, like this:\n\n​python\n<code>\n​"}
+                    {"type": "text", "text": "Objective: " + objective + "\n\nSub-task results:\n" + results_text + REFINE_INSTRUCTIONS}
                 ]
             }
         ]
 
         try:
-            opus_response = self.anthropic_client.messages.create(
+            completion = await self._complete(
+                on_text=on_text,
                 model=self.model,
                 max_tokens=4096,
                 messages=messages
             )
+        except CacheMissError:
+            raise
         except Exception as e:
-            console.print(
-                Panel(f"Error in calling Refiner: [bold]{str(e)}[/bold]", title="[bold red]Refiner Error[/bold red]",
-                      title_align="left", border_style="red"))
+            emit("error", f"Error in calling Refiner: [bold]{str(e)}[/bold]", title="Refiner Error", style="red", role=self.role)
             raise APIError(f"Error in calling Anthropic API: {str(e)}") from e
 
-        response_text = opus_response.content[0].text.strip()
-        console.print(
-            f"Input Tokens: {opus_response.usage.input_tokens}, Output Tokens: {opus_response.usage.output_tokens}")
-        total_cost = calculate_subagent_cost(self.model, opus_response.usage.input_tokens,
-                                             opus_response.usage.output_tokens)
-        self.total_cost += total_cost
-        console.print(f"Refine Cost: ${total_cost:.4f}")
-
-        if opus_response.usage.output_tokens >= 4000 and not continuation:
-            console.print(
-                "[bold yellow]Warning:[/bold yellow] Output may be truncated. Attempting to continue the response.")
-            continuation_response_text = self.refine_output(objective, sub_task_results + [response_text], filename,
-                                                            projectname, continuation=True)
-            response_text += "\n" + continuation_response_text
-
-        console.print(Panel(response_text, title="[bold green]Final Output[/bold green]", title_align="left",
-                            border_style="green"))
+        response_text = restore_code_blocks(completion.text.strip(), code_blocks) if code_blocks else completion.text.strip()
+        total_cost = self._track_completion_cost(completion)
+        self._emit_usage("Refine Cost", completion.input_tokens, completion.output_tokens, total_cost)
+
+        if not self.stream:
+            emit("refined_output", response_text, title="Final Output", style="green")
         return response_text
\ No newline at end of file
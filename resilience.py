@@ -0,0 +1,332 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+from events import emit, has_sinks
+from anthropic import APIConnectionError
+from config import settings
+from exceptions import CircuitOpenError
+from telemetry import percentile
+
+T = TypeVar("T")
+
+# Error classes. Only the first four are retried; all but RATE_LIMITED and FATAL count against the circuit breaker.
+RATE_LIMITED = "rate_limited"
+OVERLOADED = "overloaded"
+SERVER = "server"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+RETRYABLE = {RATE_LIMITED, OVERLOADED, SERVER, TRANSIENT}
+UNHEALTHY = {OVERLOADED, SERVER, TRANSIENT}
+RETRYABLE_CLIENT_STATUSES = {408, 409}
+# Reset times the API sends with a 429, in RFC 3339.
+RATE_LIMIT_RESET_HEADERS = ("anthropic-ratelimit-requests-reset", "anthropic-ratelimit-tokens-reset",
+                            "anthropic-ratelimit-input-tokens-reset", "anthropic-ratelimit-output-tokens-reset")
+# The Tavily client raises its own exception types instead of exposing the status code.
+TAVILY_ERRORS = {"UsageLimitExceededError": RATE_LIMITED, "TimeoutError": TRANSIENT}
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def classify_error(error: BaseException) -> str:
+    status = _status_code(error)
+    if status is not None:
+        if status == 429:
+            return RATE_LIMITED
+        if status in (503, 529):
+            return OVERLOADED
+        if status >= 500:
+            return SERVER
+        return TRANSIENT if status in RETRYABLE_CLIENT_STATUSES else FATAL
+    module = type(error).__module__
+    if module.startswith("tavily"):
+        return TAVILY_ERRORS.get(type(error).__name__, FATAL)
+    if isinstance(error, (APIConnectionError, ConnectionError, TimeoutError, asyncio.TimeoutError)) or module.startswith(("requests", "httpx", "urllib3")):
+        return TRANSIENT
+    return FATAL
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After or the rate-limit reset headers."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        if headers.get("retry-after"):
+            value = headers["retry-after"]
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        resets = [datetime.fromisoformat(headers[name]) for name in RATE_LIMIT_RESET_HEADERS if headers.get(name)]
+    except (TypeError, ValueError):
+        return None
+    if not resets:
+        return None
+    return max(0.0, max((reset - datetime.now(timezone.utc)).total_seconds() for reset in resets))
+
+class CircuitBreaker:
+    """Fails calls fast once a service has failed ``failure_threshold`` times in a row.
+
+    After ``reset_seconds`` one trial call is let through; its outcome closes the
+    circuit again or keeps it open for another period.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def record(self, healthy: bool) -> None:
+        with self._lock:
+            if healthy:
+                self.state, self.failures, self._trial_in_flight = "closed", 0, False
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state, self.opened_at, self._trial_in_flight = "open", time.monotonic(), False
+
+class ConcurrencyGovernor:
+    """Adaptive cap on in-flight calls to one service (additive increase, multiplicative decrease).
+
+    The cap halves at most once per second on rate-limit or overload errors and
+    creeps back up with each success. Waiters are plain futures woken with
+    ``call_soon_threadsafe``, so one governor can serve any number of event loops.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> None:
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = future not in self._waiters
+                if not granted:
+                    self._waiters.remove(future)
+            if granted and future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def _grant(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            while self._waiters and self.in_flight < int(self.limit):
+                future = self._waiters.popleft()
+                self.in_flight += 1
+                future.get_loop().call_soon_threadsafe(self._grant, future)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def on_throttled(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease >= 1.0:
+                self.limit = max(float(self.min_limit), self.limit / 2)
+                self._last_decrease = now
+
+class Resilience:
+    """Retry policy, circuit breaker, concurrency governor and request hedging for one remote service.
+
+    Shared by every caller in the process, so a 429 pauses all of them until the
+    server's Retry-After has passed instead of letting each back off on its own
+    and stampede when their timers expire.
+    """
+
+    def __init__(self, service: str, max_attempts: int, base_delay: float, max_delay: float, breaker: CircuitBreaker,
+                 governor: ConcurrencyGovernor, hedge_percentile: float = 0.95, hedge_min_samples: int = 20):
+        self.service = service
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self.governor = governor
+        self.hedging = False
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.paused_until = 0.0
+        self.retries: Dict[str, int] = {}
+        self.fast_failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        requested = retry_after(error)
+        if requested is not None:
+            # Honour the server's wait in full; up to 20% jitter spreads out the callers it released together.
+            return requested * random.uniform(1.0, 1.2)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def hedge_after(self, key: str) -> Optional[float]:
+        latencies = self._latencies.get(key)
+        if not latencies or len(latencies) < self.hedge_min_samples:
+            return None
+        return percentile(list(latencies), self.hedge_percentile)
+
+    async def _governed(self, key: Optional[str], fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        await self.governor.acquire()
+        started = time.perf_counter()
+        try:
+            result = await fn(*args, **kwargs)
+        finally:
+            self.governor.release()
+        if key is not None:
+            self._latencies.setdefault(key, deque(maxlen=200)).append(time.perf_counter() - started)
+        return result
+
+    async def _hedged(self, key: str, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        first = asyncio.ensure_future(self._governed(key, fn, *args, **kwargs))
+        delay = self.hedge_after(key)
+        if delay is None:
+            return await first
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return first.result()
+            # The call is slower than almost all recent ones; race a duplicate and keep whichever answers first.
+            self.hedges += 1
+            second = asyncio.ensure_future(self._governed(key, fn, *args, **kwargs))
+            tasks.add(second)
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args: Any, on_retry: Optional[Callable[[], None]] = None,
+                   hedge_key: Optional[str] = None, **kwargs: Any) -> T:
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.fast_failures += 1
+                raise CircuitOpenError(f"{self.service} circuit is open after {self.breaker.failures} consecutive failures; "
+                                       f"next trial in {self.breaker.retry_in():.0f}s")
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            try:
+                if self.hedging and hedge_key is not None:
+                    result = await self._hedged(hedge_key, fn, *args, **kwargs)
+                else:
+                    result = await self._governed(hedge_key, fn, *args, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                self.breaker.record(kind not in UNHEALTHY)
+                if kind in (RATE_LIMITED, OVERLOADED):
+                    self.governor.on_throttled()
+                attempt += 1
+                if kind not in RETRYABLE or attempt >= self.max_attempts:
+                    raise
+                delay = self.backoff(attempt, e)
+                if kind == RATE_LIMITED:
+                    self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                self.retries[kind] = self.retries.get(kind, 0) + 1
+                if on_retry is not None:
+                    on_retry()
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record(True)
+            self.governor.on_success()
+            return result
+
+_services: Dict[str, Resilience] = {}
+_services_lock = threading.Lock()
+
+def get_resilience(service: str) -> Resilience:
+    with _services_lock:
+        if service not in _services:
+            _services[service] = Resilience(
+                service, settings.RETRY_ATTEMPTS, settings.RETRY_DELAY, settings.RETRY_MAX_DELAY,
+                CircuitBreaker(settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_SECONDS),
+                ConcurrencyGovernor(settings.GOVERNOR_MAX_CONCURRENCY, settings.GOVERNOR_MIN_CONCURRENCY),
+                settings.HEDGE_PERCENTILE, settings.HEDGE_MIN_SAMPLES,
+            )
+            _services[service].hedging = settings.HEDGE_REQUESTS
+        return _services[service]
+
+def enable_hedging() -> None:
+    for service in ("anthropic", "tavily"):
+        get_resilience(service).hedging = True
+
+async def call_with_retries(fn: Callable[..., Awaitable[T]], *args: Any, service: str = "anthropic", on_retry: Optional[Callable[[], None]] = None,
+                            hedge_key: Optional[str] = None, **kwargs: Any) -> T:
+    # Retries wrap a single network call, never a whole agent step, so a failure
+    # late in a multi-round completion doesn't replay the rounds that succeeded.
+    return await get_resilience(service).call(fn, *args, on_retry=on_retry, hedge_key=hedge_key, **kwargs)
+
+def print_resilience_summary() -> None:
+    rows = [resilience for _, resilience in sorted(_services.items())
+            if resilience.retries or resilience.fast_failures or resilience.hedges or resilience.breaker.state != "closed"]
+    if not rows or not has_sinks():
+        return
+    from rich.table import Table
+
+    table = Table(title="Resilience", title_justify="left")
+    for column in ["Service", "Retries", "Fast Failures", "Hedges", "Hedge Wins", "Circuit", "Concurrency Cap"]:
+        table.add_column(column, justify="left" if column in ("Service", "Retries", "Circuit") else "right")
+    cells = []
+    for resilience in rows:
+        retries = ", ".join(f"{count} {kind.replace('_', ' ')}" for kind, count in sorted(resilience.retries.items())) or "0"
+        cells.append([resilience.service, retries, str(resilience.fast_failures), str(resilience.hedges), str(resilience.hedge_wins),
+                      resilience.breaker.state, f"{int(resilience.governor.limit)}/{resilience.governor.max_limit}"])
+        table.add_row(*cells[-1])
+    emit("summary", table, table="resilience", rows=cells)
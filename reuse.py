@@ -0,0 +1,184 @@
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows: prompts with a Jaccard similarity around 0.5 and up land in a shared bucket.
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+MERSENNE_PRIME = (1 << 61) - 1
+# Fixed seed, so signatures stored by one run are comparable with the next.
+_rng = random.Random(0x5EED)
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+def shingles(text: str) -> Set[str]:
+    # Word bigrams, so "tests for the parser" and "tests for the lexer" differ by more than one word in five.
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 2:
+        return set(words)
+    return {f"{first} {second}" for first, second in zip(words, words[1:])}
+
+def context_hash(*parts: Optional[str]) -> str:
+    """Fingerprint of the content a sub-task's answer depends on besides its instruction; empty when there is none."""
+    if not any(parts):
+        return ""
+    return hashlib.sha256("\0".join(part or "" for part in parts).encode("utf-8")).hexdigest()
+
+def jaccard(first: Set[str], second: Set[str]) -> float:
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+def minhash(features: Set[str]) -> List[int]:
+    hashes = [int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big") for feature in features]
+    if not hashes:
+        return [MERSENNE_PRIME] * NUM_PERMUTATIONS
+    return [min((a * value + b) % MERSENNE_PRIME for value in hashes) for a, b in PERMUTATIONS]
+
+def band_buckets(signature: List[int]) -> List[int]:
+    buckets = []
+    for band in range(BANDS):
+        rows = struct.pack(f">{ROWS_PER_BAND}Q", *signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+        # Signed, so it fits an SQLite INTEGER.
+        buckets.append(int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), "big", signed=True))
+    return buckets
+
+@dataclass
+class ReuseMatch:
+    prompt: str
+    result: str
+    model: str
+    cost: float
+    input_tokens: int
+    output_tokens: int
+    context_hash: str
+    similarity: float
+
+class ReuseIndex:
+    """Local SQLite store of past sub-task results, searchable by prompt similarity.
+
+    Prompts are indexed by MinHash signatures over word bigrams, banded for
+    locality-sensitive hashing, so a lookup only compares against the few
+    records that share a bucket. Candidates are then ranked by their exact
+    Jaccard similarity to the new prompt.
+
+    ``prompt`` should be the sub-task's instruction alone. Attached file content
+    and search context would dominate the similarity, so callers fingerprint
+    them into ``context_hash`` instead; see ``context_hash``.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self.lookups = 0
+        self.direct_hits = 0
+        self.context_hits = 0
+        self.saved_input_tokens = 0
+        self.saved_output_tokens = 0
+        self.saved_cost = 0.0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "key TEXT PRIMARY KEY, prompt TEXT NOT NULL, result TEXT NOT NULL, model TEXT NOT NULL, cost REAL NOT NULL, "
+            "input_tokens INTEGER NOT NULL, output_tokens INTEGER NOT NULL, created_at REAL NOT NULL, context_hash TEXT NOT NULL DEFAULT '')"
+        )
+        if "context_hash" not in {column[1] for column in self._conn.execute("PRAGMA table_info(records)")}:
+            self._conn.execute("ALTER TABLE records ADD COLUMN context_hash TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (band INTEGER NOT NULL, bucket INTEGER NOT NULL, key TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (band, bucket)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_key ON buckets (key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS records_created_at ON records (created_at)")
+
+    @staticmethod
+    def _key(prompt: str, context_hash: str) -> str:
+        return hashlib.sha256(f"{prompt}\0{context_hash}".encode("utf-8")).hexdigest()
+
+    def add(self, prompt: str, result: str, model: str, cost: float, input_tokens: int, output_tokens: int, context_hash: str = "") -> None:
+        if not result.strip():
+            return
+        key = self._key(prompt, context_hash)
+        buckets = band_buckets(minhash(shingles(prompt)))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM buckets WHERE key = ?", (key,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO records (key, prompt, result, model, cost, input_tokens, output_tokens, created_at, context_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, prompt, result, model, cost, input_tokens, output_tokens, time.time(), context_hash),
+                )
+                self._conn.executemany("INSERT INTO buckets (band, bucket, key) VALUES (?, ?, ?)",
+                                       [(band, bucket, key) for band, bucket in enumerate(buckets)])
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        stale = [(key,) for key, in self._conn.execute("SELECT key FROM records ORDER BY created_at ASC LIMIT ?", (count - self.max_entries,))]
+        self._conn.executemany("DELETE FROM buckets WHERE key = ?", stale)
+        self._conn.executemany("DELETE FROM records WHERE key = ?", stale)
+
+    def find(self, prompt: str, min_similarity: float, limit: int) -> List[ReuseMatch]:
+        """Return up to ``limit`` past results whose prompts are at least ``min_similarity`` similar, best first."""
+        features = shingles(prompt)
+        buckets = band_buckets(minhash(features))
+        with self._lock:
+            self.lookups += 1
+            keys = {key for band, bucket in enumerate(buckets)
+                    for key, in self._conn.execute("SELECT key FROM buckets WHERE band = ? AND bucket = ?", (band, bucket))}
+            rows = [self._conn.execute("SELECT prompt, result, model, cost, input_tokens, output_tokens, context_hash FROM records WHERE key = ?", (key,)).fetchone()
+                    for key in keys]
+        matches = []
+        for row in rows:
+            if row is None:
+                continue
+            similarity = jaccard(features, shingles(row[0]))
+            if similarity >= min_similarity:
+                matches.append(ReuseMatch(*row, similarity=similarity))
+        matches.sort(key=lambda match: match.similarity, reverse=True)
+        return matches[:limit]
+
+    def record_direct_hit(self, match: ReuseMatch) -> None:
+        with self._lock:
+            self.direct_hits += 1
+            self.saved_input_tokens += match.input_tokens
+            self.saved_output_tokens += match.output_tokens
+            self.saved_cost += match.cost
+
+    def record_context_hit(self) -> None:
+        with self._lock:
+            self.context_hits += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        return {
+            "lookups": self.lookups,
+            "direct_hits": self.direct_hits,
+            "context_hits": self.context_hits,
+            "hit_rate": (self.direct_hits + self.context_hits) / self.lookups if self.lookups else 0.0,
+            "saved_input_tokens": self.saved_input_tokens,
+            "saved_output_tokens": self.saved_output_tokens,
+            "saved_cost": self.saved_cost,
+            "entries": entries,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
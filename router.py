@@ -0,0 +1,168 @@
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+from continuation import Completion
+from events import emit, has_sinks
+from materializer import atomic_write
+from tokens import estimate_tokens
+
+# Checked in order, so a prompt that asks to "review the code" counts as code.
+TASK_PATTERNS = [
+    ("code", re.compile(r"\b(code|implement\w*|function|class|script|bug|debug\w*|refactor\w*|unit tests?|endpoint|module|compile|sql|regex)\b", re.I)),
+    ("reasoning", re.compile(r"\b(design|architect\w*|analy[sz]e|evaluate|compare|trade-?offs?|prove|strateg\w*|critique)\b", re.I)),
+    ("simple", re.compile(r"\b(summari[sz]e|list|format|extract|translate|rename|reword|classify|outline)\b", re.I)),
+]
+# Starting tier for each task type, counted from the cheapest model.
+BASE_TIERS = {"simple": 0, "general": 0, "code": 0, "reasoning": 1}
+WRITES_CODE_PATTERN = re.compile(r"\b(write|implement|create|generate|fix|refactor)\b", re.I)
+REFUSAL_PATTERN = re.compile(r"^\s*(I'm sorry|I am sorry|I apologi[sz]e|I can(?:no|')t)\b", re.I)
+# A tier skipped for its failure rate is still tried once in this many routings, so it can earn its way back.
+PROBE_INTERVAL = 10
+# Outcome counts are halved past this many, so the failure rate follows recent behaviour.
+HISTORY_WINDOW = 50
+
+def classify_task(prompt: str) -> str:
+    for task_type, pattern in TASK_PATTERNS:
+        if pattern.search(prompt):
+            return task_type
+    return "general"
+
+@dataclass
+class Route:
+    model: str
+    tier: int
+    task_type: str
+    reason: str
+    expects_code: bool = False
+    escalated: bool = False
+
+    @property
+    def label(self) -> str:
+        return f"{self.task_type}/escalated" if self.escalated else self.task_type
+
+class ModelRouter:
+    """Sends each sub-task to the cheapest model tier likely to handle it.
+
+    The starting tier comes from the task type guessed from the prompt, one tier
+    up for large prompts and for task types that a tier has recently failed too
+    often. Output that fails validation is retried one tier up. Tiers never go
+    above the model the role is configured with, so routing only makes calls
+    cheaper. Outcomes are persisted to ``history_path`` by ``save``, once per
+    run, so later runs learn from earlier ones.
+    """
+
+    def __init__(self, tiers: List[str], history_path: Optional[str] = None, large_prompt_tokens: int = 6000, min_samples: int = 5,
+                 max_failure_rate: float = 0.3):
+        self.tiers = tiers
+        self.history_path = history_path
+        self.large_prompt_tokens = large_prompt_tokens
+        self.min_samples = min_samples
+        self.max_failure_rate = max_failure_rate
+        # task type -> model -> [passed, failed] validation counts, across runs
+        self.history: Dict[str, Dict[str, List[int]]] = self._load()
+        # (task type, model) -> [calls, failed validation, escalated away], this process only
+        self.stats: Dict[Tuple[str, str], List[int]] = {}
+        self._skips: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        # Serialises whole saves, so a slower save of an older snapshot can't land after a newer one.
+        self._save_lock = threading.Lock()
+        self._dirty = False
+
+    def _load(self) -> Dict[str, Dict[str, List[int]]]:
+        if not self.history_path or not os.path.exists(self.history_path):
+            return {}
+        try:
+            with open(self.history_path, 'r') as file:
+                return json.load(file)
+        except (IOError, ValueError):
+            emit("warning", f"[bold yellow]Warning:[/bold yellow] Ignoring unreadable router history {self.history_path}")
+            return {}
+
+    def save(self) -> None:
+        """Write the history to ``history_path`` if any outcome was recorded since the last save. Blocking."""
+        with self._save_lock:
+            with self._lock:
+                if not self.history_path or not self._dirty:
+                    return
+                data = json.dumps(self.history).encode("utf-8")
+                self._dirty = False
+            os.makedirs(os.path.dirname(os.path.abspath(self.history_path)), exist_ok=True)
+            atomic_write(self.history_path, data)
+
+    def failure_rate(self, task_type: str, model: str) -> float:
+        passed, failed = self.history.get(task_type, {}).get(model, [0, 0])
+        return failed / (passed + failed) if passed + failed >= self.min_samples else 0.0
+
+    def _tiers_up_to(self, ceiling: str) -> List[str]:
+        return self.tiers[:self.tiers.index(ceiling) + 1] if ceiling in self.tiers else [ceiling]
+
+    def route(self, prompt: str, ceiling: str) -> Route:
+        tiers = self._tiers_up_to(ceiling)
+        task_type = classify_task(prompt)
+        tier = min(BASE_TIERS[task_type], len(tiers) - 1)
+        reasons = [f"{task_type} task"]
+        tokens = estimate_tokens(prompt)
+        if tokens > self.large_prompt_tokens and tier < len(tiers) - 1:
+            tier += 1
+            reasons.append(f"~{tokens} prompt tokens")
+        while tier < len(tiers) - 1 and self.failure_rate(task_type, tiers[tier]) > self.max_failure_rate:
+            with self._lock:
+                skips = self._skips[(task_type, tiers[tier])] = self._skips.get((task_type, tiers[tier]), 0) + 1
+            if skips % PROBE_INTERVAL == 0:
+                reasons.append(f"probing {tiers[tier]} despite a {self.failure_rate(task_type, tiers[tier]):.0%} failure rate")
+                break
+            reasons.append(f"{tiers[tier]} fails {self.failure_rate(task_type, tiers[tier]):.0%} of {task_type} tasks")
+            tier += 1
+        return Route(tiers[tier], tier, task_type, ", ".join(reasons),
+                     expects_code=task_type == "code" and bool(WRITES_CODE_PATTERN.search(prompt)))
+
+    def validate(self, route: Route, completion: Completion) -> Optional[str]:
+        """Return why ``completion`` is unacceptable, or None if it passes."""
+        text = completion.text.strip()
+        if not text:
+            return "empty response"
+        if completion.truncated:
+            return "still truncated after continuations"
+        if REFUSAL_PATTERN.match(text):
+            return "declined the task"
+        if route.expects_code and "```" not in text:
+            return "no code block in a code-writing task"
+        return None
+
+    def can_escalate(self, route: Route, ceiling: str) -> bool:
+        return route.tier + 1 < len(self._tiers_up_to(ceiling))
+
+    def escalate(self, route: Route, ceiling: str, problem: str) -> Optional[Route]:
+        if not self.can_escalate(route, ceiling):
+            return None
+        tiers = self._tiers_up_to(ceiling)
+        with self._lock:
+            self.stats.setdefault((route.task_type, route.model), [0, 0, 0])[2] += 1
+        return replace(route, model=tiers[route.tier + 1], tier=route.tier + 1, reason=f"escalated from {route.model}: {problem}", escalated=True)
+
+    def record(self, route: Route, passed: bool) -> None:
+        with self._lock:
+            counts = self.history.setdefault(route.task_type, {}).setdefault(route.model, [0, 0])
+            counts[0 if passed else 1] += 1
+            if sum(counts) > HISTORY_WINDOW:
+                counts[:] = [count // 2 for count in counts]
+            stats = self.stats.setdefault((route.task_type, route.model), [0, 0, 0])
+            stats[0] += 1
+            stats[1] += 0 if passed else 1
+            self._dirty = True
+
+    def print_summary(self) -> None:
+        if not self.stats or not has_sinks():
+            return
+        from rich.table import Table
+
+        table = Table(title="Model Routing", title_justify="left")
+        for column in ["Task Type", "Model", "Calls", "Failed Validation", "Escalated"]:
+            table.add_column(column, justify="left" if column in ("Task Type", "Model") else "right")
+        rows = [[task_type, model, str(calls), str(failed), str(escalated)] for (task_type, model), (calls, failed, escalated) in sorted(self.stats.items())]
+        for row in rows:
+            table.add_row(*row)
+        emit("summary", table, table="routing", rows=rows)
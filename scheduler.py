@@ -0,0 +1,104 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from events import emit
+from exceptions import PlanError
+from streaming import discard_text
+
+@dataclass
+class PlannedSubtask:
+    id: str
+    prompt: str
+    depends_on: List[str] = field(default_factory=list)
+    search_query: Optional[str] = None
+
+def validate_plan(subtasks: List[PlannedSubtask]) -> List[PlannedSubtask]:
+    ids = [subtask.id for subtask in subtasks]
+    duplicates = {subtask_id for subtask_id in ids if ids.count(subtask_id) > 1}
+    if duplicates:
+        raise PlanError(f"Duplicate sub-task ids in plan: {', '.join(sorted(duplicates))}")
+
+    known = set(ids)
+    for subtask in subtasks:
+        unknown = [dep for dep in subtask.depends_on if dep not in known]
+        if unknown:
+            raise PlanError(f"Sub-task {subtask.id} depends on unknown sub-tasks: {', '.join(unknown)}")
+
+    # Kahn's algorithm: anything left over once no node has zero in-degree is part of a cycle.
+    in_degree = {subtask.id: len(set(subtask.depends_on)) for subtask in subtasks}
+    dependents: Dict[str, List[str]] = {subtask.id: [] for subtask in subtasks}
+    for subtask in subtasks:
+        for dep in set(subtask.depends_on):
+            dependents[dep].append(subtask.id)
+    ready = [subtask_id for subtask_id, degree in in_degree.items() if degree == 0]
+    visited = 0
+    while ready:
+        current = ready.pop()
+        visited += 1
+        for dependent in dependents[current]:
+            in_degree[dependent] -= 1
+            if in_degree[dependent] == 0:
+                ready.append(dependent)
+    if visited != len(subtasks):
+        cyclic = sorted(subtask_id for subtask_id, degree in in_degree.items() if degree > 0)
+        raise PlanError(f"Plan contains a dependency cycle between: {', '.join(cyclic)}")
+    return subtasks
+
+class DAGScheduler:
+    """Runs a validated plan on a SubAgent, dispatching every ready sub-task concurrently."""
+
+    def __init__(self, sub_agent, max_concurrency: int, use_search: bool = False):
+        if max_concurrency < 1:
+            raise PlanError("max_concurrency must be at least 1")
+        self.sub_agent = sub_agent
+        self.max_concurrency = max_concurrency
+        self.use_search = use_search
+
+    async def run(self, subtasks: List[PlannedSubtask], previous_haiku_tasks: Optional[List[Dict[str, str]]] = None,
+                  stop_when: Optional[Callable[[], bool]] = None, completed_results: Optional[Dict[str, str]] = None,
+                  on_result: Optional[Callable[[PlannedSubtask, str], None]] = None) -> List[Tuple[PlannedSubtask, str]]:
+        validate_plan(subtasks)
+        previous_haiku_tasks = list(previous_haiku_tasks or [])
+        by_id: Dict[str, PlannedSubtask] = {subtask.id: subtask for subtask in subtasks}
+        # Sub-tasks finished before a resume only feed their dependants; they aren't run or returned again.
+        results: Dict[str, str] = dict(completed_results or {})
+        pending: Dict[str, PlannedSubtask] = {subtask.id: subtask for subtask in subtasks if subtask.id not in results}
+        completed: List[Tuple[PlannedSubtask, str]] = []
+        running: Dict[asyncio.Task, PlannedSubtask] = {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def execute(subtask: PlannedSubtask) -> str:
+            # Each sub-task sees the prior run history plus the results of its own dependencies.
+            context = previous_haiku_tasks + [{"task": by_id[dep].prompt, "result": results[dep]} for dep in subtask.depends_on]
+            # Concurrent streams would interleave on the console, so only a serial plan renders live.
+            on_text = discard_text if self.max_concurrency > 1 else None
+            async with semaphore:
+                return await self.sub_agent.process_subtask_async(subtask.prompt, subtask.search_query, context, self.use_search, on_text=on_text)
+
+        try:
+            while pending or running:
+                if not (stop_when and stop_when()):
+                    for subtask_id, subtask in list(pending.items()):
+                        if all(dep in results for dep in subtask.depends_on):
+                            running[asyncio.create_task(execute(subtask))] = pending.pop(subtask_id)
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    subtask = running.pop(task)
+                    result = task.result()
+                    results[subtask.id] = result
+                    completed.append((subtask, result))
+                    if on_result is not None:
+                        on_result(subtask, result)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        if pending:
+            emit("warning", f"Skipped {len(pending)} planned sub-task(s): {', '.join(pending)}", title="Plan Stopped Early", style="yellow",
+                 skipped=sorted(pending))
+        return completed
@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+from events import emit
+from resilience import call_with_retries
+from telemetry import Span, get_telemetry
+from exceptions import APIError
+
+if TYPE_CHECKING:
+    from tavily import TavilyClient
+
+SEARCH_MODEL = "tavily-qna"
+
+def normalize_query(query: str) -> str:
+    # Case, punctuation and spacing differences shouldn't cost another search.
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", query.lower())).strip()
+
+class SearchService:
+    """Tavily QnA search with normalized-query dedup, a TTL-based SQLite cache and in-flight coalescing.
+
+    ``prefetch`` starts a search in the background as soon as a query is known; a
+    later ``search`` for the same (normalized) query joins the running request
+    instead of issuing another one.
+    """
+
+    def __init__(self, tavily_client: "TavilyClient", cache_path: str, ttl_seconds: float):
+        self.tavily_client = tavily_client
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        if os.path.dirname(cache_path):
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches ("
+            "key TEXT PRIMARY KEY, query TEXT NOT NULL, answer TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def _key(normalized_query: str) -> str:
+        return hashlib.sha256(normalized_query.encode("utf-8")).hexdigest()
+
+    def _load(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT answer, created_at FROM searches WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return row[0]
+
+    def _store(self, key: str, query: str, answer: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO searches (key, query, answer, created_at) VALUES (?, ?, ?, ?)",
+                               (key, query, answer, time.time()))
+
+    def prefetch(self, query: str) -> None:
+        key = self._key(normalize_query(query))
+        if key in self._in_flight or self._load(key) is not None:
+            return
+        task = self._launch(key, query)
+        # Nobody may await a prefetch whose sub-task never runs; don't let its failure go unreported as "never retrieved".
+        task.add_done_callback(lambda finished: finished.cancelled() or finished.exception())
+
+    async def search(self, query: str) -> str:
+        key = self._key(normalize_query(query))
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        cached_answer = self._load(key)
+        if cached_answer is not None:
+            self.hits += 1
+            get_telemetry().record(Span(kind="search", role="search", model=SEARCH_MODEL, started_at=time.time(), latency=0.0, cache_hit=True))
+            return cached_answer
+        return await asyncio.shield(self._launch(key, query))
+
+    def _launch(self, key: str, query: str) -> asyncio.Task:
+        self.misses += 1
+        task = asyncio.get_running_loop().create_task(self._fetch(key, query))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return task
+
+    async def _fetch(self, key: str, query: str) -> str:
+        started_at, started = time.time(), time.perf_counter()
+        retries = 0
+
+        def count_retry() -> None:
+            nonlocal retries
+            retries += 1
+
+        try:
+            answer = await call_with_retries(asyncio.to_thread, self.tavily_client.qna_search, service="tavily", on_retry=count_retry,
+                                           hedge_key="qna_search", query=query)
+        except Exception as e:
+            get_telemetry().record(Span(kind="search", role="search", model=SEARCH_MODEL, started_at=started_at, latency=time.perf_counter() - started,
+                                        retries=retries, status="error", error=f"{type(e).__name__}: {e}"))
+            emit("error", f"Error in calling Tavily QnA Search: [bold]{str(e)}[/bold]", title="QnA Search Error", style="red", query=query)
+            raise APIError(f"Error in calling Tavily QnA Search: {str(e)}") from e
+        get_telemetry().record(Span(kind="search", role="search", model=SEARCH_MODEL, started_at=started_at, latency=time.perf_counter() - started,
+                                    retries=retries))
+        answer = str(answer)
+        self._store(key, query, answer)
+        return answer
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
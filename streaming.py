@@ -0,0 +1,98 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Generic, Optional, Tuple, TypeVar
+from anthropic.types import Message
+from events import emit
+
+T = TypeVar("T")
+TextCallback = Callable[[str], None]
+
+@dataclass
+class StreamStats:
+    time_to_first_token: Optional[float]
+    duration: float
+    output_tokens: int
+
+    @property
+    def tokens_per_second(self) -> float:
+        # Measured over the generation phase only, so a slow first token doesn't skew throughput.
+        generation_time = self.duration - (self.time_to_first_token or 0.0)
+        return self.output_tokens / generation_time if generation_time > 0 else 0.0
+
+def render_text(text: str) -> None:
+    emit("text_delta", text)
+
+def discard_text(text: str) -> None:
+    pass
+
+async def stream_message(anthropic_client: Any, on_text: TextCallback, **kwargs: Any) -> Tuple[Message, StreamStats]:
+    """Run a Messages API request in streaming mode, passing each text delta to ``on_text`` as it arrives."""
+    started = time.perf_counter()
+    first_token_at: Optional[float] = None
+    manager = anthropic_client.messages.stream(**kwargs)
+
+    if hasattr(manager, "__aenter__"):
+        async with manager as stream:
+            async for text in stream.text_stream:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                on_text(text)
+            message = await stream.get_final_message()
+    else:
+        # Blocking client: drain the stream in a worker thread and hop each delta back onto the loop.
+        loop = asyncio.get_running_loop()
+
+        def consume() -> Message:
+            nonlocal first_token_at
+            with manager as stream:
+                for text in stream.text_stream:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    loop.call_soon_threadsafe(on_text, text)
+                return stream.get_final_message()
+
+        message = await asyncio.to_thread(consume)
+
+    finished = time.perf_counter()
+    stats = StreamStats(
+        time_to_first_token=first_token_at - started if first_token_at is not None else None,
+        duration=finished - started,
+        output_tokens=message.usage.output_tokens,
+    )
+    return message, stats
+
+class TextStream(Generic[T]):
+    """Consume an agent call as an async generator of text deltas.
+
+    ``call`` is any agent coroutine method accepting ``on_text`` (e.g.
+    ``sub_agent.process_subtask_async``); its return value is available as
+    ``result`` once iteration finishes::
+
+        stream = TextStream(sub_agent.process_subtask_async, prompt)
+        async for delta in stream:
+            ...
+        final_text = stream.result
+    """
+
+    def __init__(self, call: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any):
+        self._call = call
+        self._args = args
+        self._kwargs = kwargs
+        self.result: Optional[T] = None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        task = asyncio.create_task(self._call(*self._args, on_text=queue.put_nowait, **self._kwargs))
+        task.add_done_callback(lambda _: queue.put_nowait(done))
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                yield item
+            self.result = await task
+        finally:
+            if not task.done():
+                task.cancel()
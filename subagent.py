@@ -1,40 +1,65 @@
-from anthropic import Anthropic
+import asyncio
+from base_agent import BaseAgent, AnthropicClient
+from resilience import call_with_retries
+from utils import run_sync, split_file_content
+from events import emit
+from cache import ResponseCache
+from ratelimit import RateLimiter
+from search import SearchService
+from router import ModelRouter, Route
+from reuse import ReuseIndex, ReuseMatch, context_hash
 from config import settings
-from utils import calculate_subagent_cost
-from rich.console import Console
-from rich.panel import Panel
-from tavily import TavilyClient
-from tenacity import retry, stop_after_attempt, wait_exponential
-from exceptions import APIError
-from typing import Dict, Any, List, Tuple, Optional
-
-console = Console()
-
-class SubAgent:
-    def __init__(self, anthropic_client: Anthropic, model: str, tavily_client: TavilyClient):
-        self.anthropic_client = anthropic_client
-        self.model = model
+from streaming import TextCallback, discard_text, render_text
+from exceptions import APIError, CacheMissError
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional
+
+if TYPE_CHECKING:
+    from tavily import TavilyClient
+
+class SubAgent(BaseAgent):
+    role = "sub_agent"
+
+    def __init__(self, anthropic_client: AnthropicClient, model: str, tavily_client: Optional["TavilyClient"], response_cache: Optional[ResponseCache] = None, stream: bool = False,
+                 rate_limiter: Optional[RateLimiter] = None, search_service: Optional[SearchService] = None, router: Optional[ModelRouter] = None,
+                 reuse_index: Optional[ReuseIndex] = None):
+        super().__init__(anthropic_client, model, response_cache, stream, rate_limiter)
         self.tavily_client = tavily_client
-        self.total_cost = 0.0
+        self.search_service = search_service
+        self.router = router
+        self.reuse_index = reuse_index
+        # prompt -> (instruction, context hash, model, cost, input tokens, output tokens) of the calls that answered it, for the reuse index
+        self.outcomes: Dict[str, Tuple[str, str, str, float, int, int]] = {}
 
-    @retry(stop=stop_after_attempt(settings.RETRY_ATTEMPTS), wait=wait_exponential(multiplier=1, min=4, max=60))
-    def process_subtask(self, prompt: str, search_query: Optional[str] = None, previous_haiku_tasks: Optional[List[Dict[str, str]]] = None, use_search: bool = False, continuation: bool = False) -> str:
+    def process_subtask(self, prompt: str, search_query: Optional[str] = None, previous_haiku_tasks: Optional[List[Dict[str, str]]] = None, use_search: bool = False, on_text: Optional[TextCallback] = None) -> str:
+        return run_sync(self.process_subtask_async(prompt, search_query, previous_haiku_tasks, use_search, on_text=on_text))
+
+    async def process_subtask_async(self, prompt: str, search_query: Optional[str] = None, previous_haiku_tasks: Optional[List[Dict[str, str]]] = None, use_search: bool = False, on_text: Optional[TextCallback] = None) -> str:
         if previous_haiku_tasks is None:
             previous_haiku_tasks = []
 
-        continuation_prompt = "Continuing from the previous answer, please complete the response."
         system_message = "Previous Haiku tasks:\n" + "\n".join(
             f"Task: {task['task']}\nResult: {task['result']}" for task in previous_haiku_tasks)
-        if continuation:
-            prompt = continuation_prompt
+
+        # Similarity is judged on the instruction alone: an attached file would dominate it, so two different tasks on the
+        # same file would look alike. A result is only reused directly if the file and search query match exactly too.
+        instruction, file_content = split_file_content(prompt)
+        reuse_context = context_hash(file_content, search_query if use_search else None)
+        similar: List[ReuseMatch] = []
+        if self.reuse_index is not None:
+            similar = await asyncio.to_thread(self.reuse_index.find, instruction, settings.REUSE_CONTEXT_SIMILARITY, settings.REUSE_MAX_CONTEXT_RESULTS)
+            if similar and similar[0].similarity >= settings.REUSE_DIRECT_SIMILARITY and similar[0].context_hash == reuse_context:
+                return self._reuse(similar[0], on_text)
 
         qna_response = None
-        if search_query and use_search:
+        if search_query and use_search and self.search_service is not None:
+            qna_response = await self.search_service.search(search_query)
+            emit("search_result", f"QnA response: {qna_response}", style="yellow", query=search_query)
+        elif search_query and use_search:
             try:
-                qna_response = self.tavily_client.qna_search(query=search_query)
-                console.print(f"QnA response: {qna_response}", style="yellow")
+                qna_response = await call_with_retries(asyncio.to_thread, self.tavily_client.qna_search, service="tavily", query=search_query)
+                emit("search_result", f"QnA response: {qna_response}", style="yellow", query=search_query)
             except Exception as e:
-                console.print(Panel(f"Error in calling Tavily QnA Search: [bold]{str(e)}[/bold]", title="[bold red]QnA Search Error[/bold red]", title_align="left", border_style="red"))
+                emit("error", f"Error in calling Tavily QnA Search: [bold]{str(e)}[/bold]", title="QnA Search Error", style="red")
                 raise APIError(f"Error in calling Tavily QnA Search: {str(e)}") from e
 
         messages = [
@@ -46,35 +71,75 @@ class SubAgent:
 
         if qna_response:
             messages[0]["content"].append({"type": "text", "text": f"\nSearch Results:\n{qna_response}"})
+        if similar:
+            self.reuse_index.record_context_hit()
+            emit("reuse", f"Offering {len(similar)} similar earlier result(s) as context (best match {similar[0].similarity:.0%})",
+                 style="cyan", mode="context", similarity=similar[0].similarity)
+            messages[0]["content"].append({"type": "text", "text": "\nSimilar sub-tasks answered earlier. Reuse whatever applies, and correct "
+                                           "anything that doesn't fit this task:\n" + "\n\n".join(
+                                               f"Task: {match.prompt}\nResult: {match.result}" for match in similar)})
+
+        route: Optional[Route] = None
+        if self.router is not None:
+            route = self.router.route(prompt, self.model)
+            emit("route", f"Routed to [bold]{route.model}[/bold] ({route.reason})", model=route.model, task_type=route.task_type)
+
+        total_cost = 0.0
+        input_tokens = output_tokens = 0
+        while True:
+            model = route.model if route is not None else self.model
+            # An answer that may still be rejected and escalated isn't streamed; it is replayed below if it's kept.
+            provisional = self.stream and route is not None and self.router.can_escalate(route, self.model)
+            try:
+                completion = await self._complete(
+                    on_text=discard_text if provisional else on_text,
+                    route=route.label if route is not None else None,
+                    model=model,
+                    max_tokens=4096,
+                    messages=messages,
+                    system=system_message
+                )
+            except CacheMissError:
+                raise
+            except Exception as e:
+                emit("error", f"Error in calling SubAgent: [bold]{str(e)}[/bold]", title="SubAgent Error", style="red", role=self.role)
+                raise APIError(f"Error in calling Anthropic API: {str(e)}") from e
+
+            emit("usage", f"Input Tokens: {completion.input_tokens}, Output Tokens: {completion.output_tokens}", role=self.role, model=model,
+                 input_tokens=completion.input_tokens, output_tokens=completion.output_tokens)
+            total_cost += self._track_completion_cost(completion, model)
+            input_tokens += completion.input_tokens
+            output_tokens += completion.output_tokens
+            if route is None:
+                break
+            problem = self.router.validate(route, completion)
+            self.router.record(route, problem is None)
+            escalated = self.router.escalate(route, self.model, problem) if problem is not None else None
+            if escalated is None:
+                if provisional:
+                    (on_text or render_text)(completion.text)
+                    if on_text is None:
+                        emit("text_delta", "\n")
+                break
+            emit("route", f"[bold yellow]Escalating[/bold yellow] from {route.model} to [bold]{escalated.model}[/bold]: {problem}",
+                 model=escalated.model, task_type=route.task_type, escalated_from=route.model, problem=problem)
+            route = escalated
+
+        response_text = completion.text
+        self.outcomes[prompt] = (instruction, reuse_context, model, total_cost, input_tokens, output_tokens)
+        emit("cost", f"Sub-agent Cost: ${total_cost:.4f}", role=self.role, cost=total_cost)
+
+        if not self.stream:
+            emit("subtask_result", response_text, title="Haiku Sub-agent Result", style="blue", subtitle="Task completed, sending result to Opus 👇")
+        return response_text
 
-        try:
-            haiku_response = self.anthropic_client.messages.create(
-                model=self.model,
-                max_tokens=4096,
-                messages=messages,
-                system=system_message
-            )
-        except Exception as e:
-            console.print(
-                Panel(f"Error in calling SubAgent: [bold]{str(e)}[/bold]", title="[bold red]SubAgent Error[/bold red]",
-                      title_align="left", border_style="red"))
-            raise APIError(f"Error in calling Anthropic API: {str(e)}") from e
-
-        response_text = haiku_response.content[0].text
-        console.print(
-            f"Input Tokens: {haiku_response.usage.input_tokens}, Output Tokens: {haiku_response.usage.output_tokens}")
-        total_cost = calculate_subagent_cost(self.model, haiku_response.usage.input_tokens,
-                                             haiku_response.usage.output_tokens)
-        self.total_cost += total_cost
-        console.print(f"Sub-agent Cost: ${total_cost:.4f}")
-
-        if haiku_response.usage.output_tokens >= 4000:  # Threshold set to 4000 as a precaution
-            console.print(
-                "[bold yellow]Warning:[/bold yellow] Output may be truncated. Attempting to continue the response.")
-            continuation_response_text = self.process_subtask(prompt, search_query, previous_haiku_tasks, use_search,
-                                                              continuation=True)
-            response_text += continuation_response_text
-
-        console.print(Panel(response_text, title="[bold blue]Haiku Sub-agent Result[/bold blue]", title_align="left",
-                            border_style="blue", subtitle="Task completed, sending result to Opus 👇"))
-        return response_text
\ No newline at end of file
+    def _reuse(self, match: ReuseMatch, on_text: Optional[TextCallback]) -> str:
+        self.reuse_index.record_direct_hit(match)
+        emit("reuse", f"Reusing an earlier result ({match.similarity:.0%} similar prompt), saving ~{match.input_tokens + match.output_tokens} tokens "
+             f"and ${match.cost:.4f}", style="cyan", mode="direct", similarity=match.similarity, model=match.model,
+             saved_tokens=match.input_tokens + match.output_tokens, saved_cost=match.cost)
+        if self.stream and on_text is not None:
+            on_text(match.result)
+        else:
+            emit("subtask_result", match.result, title="Reused Sub-agent Result", style="blue", subtitle="Task completed, sending result to Opus 👇")
+        return match.result
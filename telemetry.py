@@ -0,0 +1,146 @@
+import json
+import math
+import threading
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Deque, Dict, List, Optional, Tuple
+from events import emit, has_sinks
+from materializer import atomic_write
+
+@dataclass
+class Span:
+    kind: str
+    role: str
+    model: str
+    started_at: float
+    latency: float
+    ttft: Optional[float] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+    retries: int = 0
+    cache_hit: bool = False
+    status: str = "ok"
+    error: Optional[str] = None
+    route: Optional[str] = None
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class Telemetry:
+    """In-process collector of per-call spans for every Anthropic and Tavily call.
+
+    Recording is a single append to a bounded deque, so it stays off the hot path;
+    aggregation only happens when a summary or export is requested.
+    """
+
+    def __init__(self, max_spans: int = 100_000):
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def snapshot(self) -> List[Span]:
+        with self._lock:
+            return list(self.spans)
+
+    def _groups(self) -> Dict[Tuple[str, str, str], List[Span]]:
+        groups: Dict[Tuple[str, str, str], List[Span]] = {}
+        for span in self.snapshot():
+            groups.setdefault((span.kind, span.role, span.model), []).append(span)
+        return groups
+
+    def export_jsonl(self, path: str) -> None:
+        with open(path, 'a') as file:
+            for span in self.snapshot():
+                file.write(json.dumps(asdict(span)) + "\n")
+
+    def export_prometheus(self, path: str) -> None:
+        lines = [
+            "# HELP agentic_calls_total Model and search calls by outcome.",
+            "# TYPE agentic_calls_total counter",
+        ]
+        groups = self._groups()
+        for (kind, role, model), spans in sorted(groups.items()):
+            labels = f'kind="{kind}",role="{_escape_label(role)}",model="{_escape_label(model)}"'
+            for status in sorted({span.status for span in spans}):
+                lines.append(f'agentic_calls_total{{{labels},status="{status}"}} {sum(1 for span in spans if span.status == status)}')
+        metrics = [
+            ("agentic_tokens_total", "counter", "Tokens processed.", None),
+            ("agentic_cost_dollars_total", "counter", "Estimated spend in US dollars.", lambda spans: sum(span.cost for span in spans)),
+            ("agentic_retries_total", "counter", "Retries fired before a call succeeded or gave up.", lambda spans: sum(span.retries for span in spans)),
+            ("agentic_cache_hits_total", "counter", "Calls answered from a cache.", lambda spans: sum(1 for span in spans if span.cache_hit)),
+        ]
+        for name, metric_type, help_text, aggregate in metrics:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+            for (kind, role, model), spans in sorted(groups.items()):
+                labels = f'kind="{kind}",role="{_escape_label(role)}",model="{_escape_label(model)}"'
+                if aggregate is None:
+                    lines.append(f'{name}{{{labels},direction="input"}} {sum(span.input_tokens for span in spans)}')
+                    lines.append(f'{name}{{{labels},direction="output"}} {sum(span.output_tokens for span in spans)}')
+                else:
+                    lines.append(f"{name}{{{labels}}} {aggregate(spans)}")
+        routed = [span for span in self.snapshot() if span.route is not None]
+        if routed:
+            lines += ["# HELP agentic_routed_calls_total Model calls placed by the router, by task type and escalation.",
+                      "# TYPE agentic_routed_calls_total counter"]
+            route_counts: Dict[Tuple[str, str, str], int] = {}
+            for span in routed:
+                route_key = (span.role, span.model, span.route)
+                route_counts[route_key] = route_counts.get(route_key, 0) + 1
+            for (role, model, route), count in sorted(route_counts.items()):
+                lines.append(f'agentic_routed_calls_total{{role="{_escape_label(role)}",model="{_escape_label(model)}",'
+                             f'route="{_escape_label(route)}"}} {count}')
+        for name, help_text, value in [("agentic_call_latency_seconds", "Wall-clock latency per call.", lambda span: span.latency),
+                                       ("agentic_time_to_first_token_seconds", "Time to first streamed token.", lambda span: span.ttft)]:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+            for (kind, role, model), spans in sorted(groups.items()):
+                values = [value(span) for span in spans if value(span) is not None and not span.cache_hit]
+                if not values:
+                    continue
+                labels = f'kind="{kind}",role="{_escape_label(role)}",model="{_escape_label(model)}"'
+                for quantile in (0.5, 0.95, 0.99):
+                    lines.append(f'{name}{{{labels},quantile="{quantile}"}} {percentile(values, quantile):.6f}')
+                lines.append(f"{name}_sum{{{labels}}} {sum(values):.6f}")
+                lines.append(f"{name}_count{{{labels}}} {len(values)}")
+
+        # node_exporter's textfile collector may read at any moment, usually as another user, so write atomically and world-readable.
+        atomic_write(path, ("\n".join(lines) + "\n").encode("utf-8"), mode=0o644)
+
+    def print_summary(self) -> None:
+        groups = self._groups()
+        if not groups or not has_sinks():
+            return
+        from rich.table import Table
+
+        table = Table(title="Call Telemetry", title_justify="left")
+        for column in ["Role", "Model", "Calls", "Errors", "p50 s", "p95 s", "TTFT s", "In Tok", "Out Tok", "Retries", "Cached", "Cost"]:
+            table.add_column(column, justify="left" if column in ("Role", "Model") else "right")
+        rows = []
+        for (_, role, model), spans in sorted(groups.items()):
+            latencies = [span.latency for span in spans if not span.cache_hit]
+            ttfts = [span.ttft for span in spans if span.ttft is not None]
+            rows.append([
+                role, model, str(len(spans)),
+                str(sum(1 for span in spans if span.status != "ok")),
+                f"{percentile(latencies, 0.5):.2f}", f"{percentile(latencies, 0.95):.2f}",
+                f"{percentile(ttfts, 0.5):.2f}" if ttfts else "-",
+                str(sum(span.input_tokens for span in spans)), str(sum(span.output_tokens for span in spans)),
+                str(sum(span.retries for span in spans)), str(sum(1 for span in spans if span.cache_hit)),
+                f"${sum(span.cost for span in spans):.4f}",
+            ])
+            table.add_row(*rows[-1])
+        emit("summary", table, table="telemetry", rows=rows)
+
+_telemetry = Telemetry()
+
+def get_telemetry() -> Telemetry:
+    return _telemetry
@@ -0,0 +1,24 @@
+import unittest
+from support import MODEL, MessagesServer
+
+from anthropic import AsyncAnthropic
+from anthropic.types import Message
+from base_agent import BaseAgent
+
+class AsyncClientTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = MessagesServer()
+
+    def tearDown(self):
+        self.server.close()
+
+    async def test_async_client_call_is_awaited(self):
+        client = AsyncAnthropic(api_key="test", base_url=self.server.base_url, max_retries=0)
+        agent = BaseAgent(client, MODEL)
+        response = await agent._create_message(model=MODEL, max_tokens=16, messages=[{"role": "user", "content": "ping"}])
+        await client.close()
+        self.assertIsInstance(response, Message)
+        self.assertEqual(response.content[0].text, "answer 1")
+
+if __name__ == "__main__":
+    unittest.main()
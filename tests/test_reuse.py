@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+from support import MODEL, MessagesServer
+
+from anthropic import AsyncAnthropic
+from config import settings
+from events import get_event_bus
+from main import remember_results
+from reuse import ReuseIndex, jaccard, shingles
+from subagent import SubAgent
+from utils import attach_file_content
+
+FILE = "\n".join(f"def helper_{i}(value):\n    return value * {i} + len(str(value))\n" for i in range(60))
+
+class SubAgentReuseTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        get_event_bus().configure([])
+        self.server = MessagesServer()
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = ReuseIndex(os.path.join(self.directory.name, "reuse.sqlite3"), 100)
+        self.client = AsyncAnthropic(api_key="test", base_url=self.server.base_url, max_retries=0)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        self.index.close()
+        self.directory.cleanup()
+        self.server.close()
+
+    async def run_subtask(self, prompt: str) -> str:
+        sub_agent = SubAgent(self.client, MODEL, None, reuse_index=self.index)
+        result = await sub_agent.process_subtask_async(prompt)
+        remember_results(self.index, sub_agent, [(prompt, result)])
+        return result
+
+    async def test_different_instructions_on_the_same_file_are_not_reused(self):
+        tests = attach_file_content("Write unit tests for utils.py", FILE)
+        docstrings = attach_file_content("Add docstrings to utils.py", FILE)
+        # The attached file makes the whole prompts look nearly identical.
+        self.assertGreaterEqual(jaccard(shingles(tests), shingles(docstrings)), settings.REUSE_DIRECT_SIMILARITY)
+
+        self.assertEqual(await self.run_subtask(tests), "answer 1")
+        self.assertEqual(await self.run_subtask(docstrings), "answer 2")
+        self.assertEqual(self.index.direct_hits, 0)
+
+    async def test_same_instruction_on_another_file_is_not_reused(self):
+        await self.run_subtask(attach_file_content("Write unit tests for utils.py", FILE))
+        self.assertEqual(await self.run_subtask(attach_file_content("Write unit tests for utils.py", FILE.replace("* 7", "* 8"))), "answer 2")
+        self.assertEqual(self.index.direct_hits, 0)
+
+    async def test_same_instruction_on_the_same_file_is_reused(self):
+        prompt = attach_file_content("Write unit tests for utils.py", FILE)
+        await self.run_subtask(prompt)
+        self.assertEqual(await self.run_subtask(prompt), "answer 1")
+        self.assertEqual(self.server.calls, 1)
+        self.assertEqual(self.index.direct_hits, 1)
+
+if __name__ == "__main__":
+    unittest.main()
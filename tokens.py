@@ -0,0 +1,77 @@
+import copy
+import math
+from typing import Any, Dict, List, Optional, Union
+from events import emit
+
+# Claude 3 models all share a 200k-token context window.
+MODEL_CONTEXT_WINDOWS = {
+    "claude-3-opus-20240229": 200_000,
+    "claude-3-sonnet-20240229": 200_000,
+    "claude-3-haiku-20240307": 200_000,
+}
+DEFAULT_CONTEXT_WINDOW = 200_000
+
+# A deliberately conservative local estimate (English prose averages ~4 characters
+# per token), so budgets can be enforced before every call without a network round trip.
+CHARS_PER_TOKEN = 3.5
+TRUNCATION_MARKER = "\n\n[... content truncated to fit the context window ...]\n\n"
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def _text_blocks(content: Union[str, List[Dict[str, Any]]]) -> List[str]:
+    if isinstance(content, str):
+        return [content]
+    return [block.get("text", "") for block in content if block.get("type") == "text"]
+
+def estimate_request_tokens(system: Optional[Union[str, List[Dict[str, Any]]]], messages: List[Dict[str, Any]]) -> int:
+    total = sum(estimate_tokens(text) for text in _text_blocks(system)) if system else 0
+    for message in messages:
+        total += sum(estimate_tokens(text) for text in _text_blocks(message["content"]))
+    return total
+
+def truncate_middle(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    keep_chars = max(0, int(max_tokens * CHARS_PER_TOKEN) - len(TRUNCATION_MARKER))
+    head = keep_chars // 2
+    return text[:head] + TRUNCATION_MARKER + text[len(text) - (keep_chars - head):]
+
+def group_by_budget(texts: List[str], budget_tokens: int) -> List[List[str]]:
+    """Split ``texts`` into consecutive groups of roughly ``budget_tokens`` each, for one reduce level."""
+    groups: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        # Always pair at least two items so every reduce level shrinks the list.
+        if len(current) >= 2 and current_tokens + tokens > budget_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def fit_to_context_window(model: str, system: Optional[str], messages: List[Dict[str, Any]], max_tokens: int) -> List[Dict[str, Any]]:
+    """Return ``messages`` unchanged if the request fits, otherwise a copy with the largest text blocks middle-truncated."""
+    limit = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW) - max_tokens
+    overflow = estimate_request_tokens(system, messages) - limit
+    if overflow <= 0:
+        return messages
+
+    emit("warning", f"[bold yellow]Warning:[/bold yellow] Request is ~{overflow} tokens over the context window of {model}; truncating the largest inputs.")
+    messages = copy.deepcopy(messages)
+    while overflow > 0:
+        blocks = [block for message in messages if isinstance(message["content"], list)
+                  for block in message["content"] if block.get("type") == "text"]
+        if not blocks:
+            break
+        largest = max(blocks, key=lambda block: len(block["text"]))
+        before = estimate_tokens(largest["text"])
+        if before <= estimate_tokens(TRUNCATION_MARKER):
+            break
+        largest["text"] = truncate_middle(largest["text"], max(0, before - overflow))
+        overflow -= before - estimate_tokens(largest["text"])
+    return messages
@@ -1,14 +1,23 @@
 import re
-import os
 import json
-from rich.console import Console
-from rich.panel import Panel
-from tenacity import retry, stop_after_attempt, wait_fixed
+import asyncio
+from events import emit
 from exceptions import FileIOError
+from materializer import materialize_project, print_report
 from config import settings
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, Coroutine, TypeVar
 
-console = Console()
+FILE_CONTENT_SEPARATOR = "\n\nFile content:\n"
+
+T = TypeVar("T")
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    coro.close()
+    raise RuntimeError("Synchronous agent API called from a running event loop; await the *_async variant instead.")
 
 def calculate_subagent_cost(model: str, input_tokens: int, output_tokens: int) -> float:
     pricing = {
@@ -20,7 +29,6 @@ def calculate_subagent_cost(model: str, input_tokens: int, output_tokens: int) -
     output_cost = (output_tokens / 1_000_000) * pricing[model]["output_cost_per_mtok"]
     return input_cost + output_cost
 
-@retry(stop=stop_after_attempt(settings.RETRY_ATTEMPTS), wait=wait_fixed(settings.RETRY_DELAY))
 def read_file(file_path: str) -> str:
     try:
         with open(file_path, 'r') as file:
@@ -30,35 +38,27 @@ def read_file(file_path: str) -> str:
 
 def create_folder_structure(project_name: str, folder_structure: Dict[str, Any], code_blocks: List[Tuple[str, str]]) -> None:
     try:
-        os.makedirs(project_name, exist_ok=True)
-        console.print(Panel(f"Created project folder: [bold]{project_name}[/bold]", title="[bold green]Project Folder[/bold green]", title_align="left", border_style="green"))
+        report = materialize_project(project_name, folder_structure, code_blocks, settings.MATERIALIZE_WORKERS)
     except OSError as e:
-        console.print(Panel(f"Error creating project folder: [bold]{project_name}[/bold]\nError: {e}", title="[bold red]Project Folder Creation Error[/bold red]", title_align="left", border_style="red"))
+        emit("error", f"Error creating project folder: [bold]{project_name}[/bold]\nError: {e}", title="Project Folder Creation Error", style="red")
         return
+    print_report(report)
+
+def preview_text(text: str, max_lines: int = 20) -> str:
+    # Split lazily so previewing a multi-megabyte file doesn't build a list of every line.
+    head = text.split("\n", max_lines)
+    if len(head) <= max_lines:
+        return text
+    remaining = text.count("\n") - max_lines + 1
+    return "\n".join(head[:max_lines]) + f"\n... ({remaining:,} more line(s), {len(text):,} characters in total)"
 
-    create_folders_and_files(project_name, folder_structure, code_blocks)
+def attach_file_content(prompt: str, file_content: str) -> str:
+    return f"{prompt}{FILE_CONTENT_SEPARATOR}{file_content}"
 
-def create_folders_and_files(current_path: str, structure: Dict[str, Any], code_blocks: List[Tuple[str, str]]) -> None:
-    for key, value in structure.items():
-        path = os.path.join(current_path, key)
-        if isinstance(value, dict):
-            try:
-                os.makedirs(path, exist_ok=True)
-                console.print(Panel(f"Created folder: [bold]{path}[/bold]", title="[bold blue]Folder Creation[/bold blue]", title_align="left", border_style="blue"))
-                create_folders_and_files(path, value, code_blocks)
-            except OSError as e:
-                console.print(Panel(f"Error creating folder: [bold]{path}[/bold]\nError: {e}", title="[bold red]Folder Creation Error[/bold red]", title_align="left", border_style="red"))
-        else:
-            code_content = next((code for file, code in code_blocks if file == key), None)
-            if code_content:
-                try:
-                    with open(path, 'w') as file:
-                        file.write(code_content)
-                    console.print(Panel(f"Created file: [bold]{path}[/bold]", title="[bold green]File Creation[/bold green]", title_align="left", border_style="green"))
-                except IOError as e:
-                    console.print(Panel(f"Error creating file: [bold]{path}[/bold]\nError: {e}", title="[bold red]File Creation Error[/bold red]", title_align="left", border_style="red"))
-            else:
-                console.print(Panel(f"Code content not found for file: [bold]{key}[/bold]", title="[bold yellow]Missing Code Content[/bold yellow]", title_align="left", border_style="yellow"))
+def split_file_content(prompt: str) -> Tuple[str, str]:
+    """Split a sub-task prompt into its instruction and the file content attached by ``attach_file_content``, if any."""
+    instruction, _, file_content = prompt.partition(FILE_CONTENT_SEPARATOR)
+    return instruction, file_content
 
 def extract_file_path(objective: str, file_path: str) -> str:
     return objective.split(file_path)[0].strip() if file_path in objective else objective
@@ -86,4 +86,4 @@ def save_exchange_log(filename: str, objective: str, task_exchanges: List[Tuple[
         with open(filename, 'w') as file:
             file.write(exchange_log)
     except IOError as e:
-        console.print(Panel(f"Error saving exchange log: [bold]{filename}[/bold]\nError: {e}", title="[bold red]Exchange Log Save Error[/bold red]", title_align="left", border_style="red"))
\ No newline at end of file
+        emit("error", f"Error saving exchange log: [bold]{filename}[/bold]\nError: {e}", title="Exchange Log Save Error", style="red")
\ No newline at end of file